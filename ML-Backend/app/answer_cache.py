@@ -0,0 +1,147 @@
+# app/answer_cache.py
+"""
+LRU + TTL cache of chat answers, optionally persisted to SQLite.
+
+Keys combine the normalised question with a fingerprint of the syllabus it
+was answered against, so uploads and reparses naturally invalidate entries.
+"""
+
+import os
+import re
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Dict, Optional, Union
+
+from app.db import pool_for
+
+
+_WS_RE = re.compile(r"\s+")
+
+
+def normalize_query(query: str) -> str:
+    q = _WS_RE.sub(" ", (query or "").strip().lower())
+    return q.rstrip("?.! ")
+
+
+def make_key(*parts: Any) -> str:
+    raw = "\x1f".join(str(p) for p in parts)
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+
+class AnswerCache:
+    def __init__(self, max_size: int = 512, ttl: float = 3600.0,
+                 db_path: Optional[Union[str, Path]] = None):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.db_path = db_path
+        self.db = pool_for(db_path) if db_path else None
+        self.hits = 0
+        self.misses = 0
+        self._items: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        if db_path:
+            self._init_db()
+
+    def _init_db(self):
+        with self.db.connection() as con:
+            con.execute(
+                """
+                CREATE TABLE IF NOT EXISTS answer_cache (
+                    key TEXT PRIMARY KEY,
+                    answer TEXT NOT NULL,
+                    created_at REAL NOT NULL
+                );
+                """
+            )
+            con.commit()
+
+    def _load(self, key: str) -> Optional[tuple]:
+        try:
+            with self.db.connection() as con:
+                row = con.execute(
+                    "SELECT answer, created_at FROM answer_cache WHERE key = ?", (key,)).fetchone()
+        except Exception as e:
+            print(f"⚠️ Answer cache read failed: {e}")
+            return None
+        return (row[0], row[1]) if row else None
+
+    def _store(self, key: str, answer: str, created_at: float):
+        try:
+            with self.db.connection() as con:
+                con.execute(
+                    "INSERT OR REPLACE INTO answer_cache (key, answer, created_at) VALUES (?, ?, ?)",
+                    (key, answer, created_at),
+                )
+                con.execute(
+                    "DELETE FROM answer_cache WHERE created_at < ?", (time.time() - self.ttl,))
+                con.commit()
+        except Exception as e:
+            print(f"⚠️ Answer cache write failed: {e}")
+
+    def _lookup(self, key: str, count: bool) -> Optional[str]:
+        now = time.time()
+        with self._lock:
+            item = self._items.get(key)
+            if item is not None and now - item[1] <= self.ttl:
+                self._items.move_to_end(key)
+                self.hits += count
+                return item[0]
+            self._items.pop(key, None)
+
+        item = self._load(key) if self.db_path else None
+        with self._lock:
+            if item is not None and now - item[1] <= self.ttl:
+                self._put_locked(key, item)
+                self.hits += count
+                return item[0]
+            self.misses += count
+            return None
+
+    def get(self, key: str) -> Optional[str]:
+        return self._lookup(key, count=True)
+
+    def peek(self, key: str) -> Optional[str]:
+        """Like get(), but leaves the hit/miss counters alone (for re-checks)."""
+        return self._lookup(key, count=False)
+
+    def put(self, key: str, answer: str):
+        item = (answer, time.time())
+        with self._lock:
+            self._put_locked(key, item)
+        if self.db_path:
+            self._store(key, *item)
+
+    def _put_locked(self, key: str, item: tuple):
+        self._items[key] = item
+        self._items.move_to_end(key)
+        while len(self._items) > self.max_size:
+            self._items.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "size": len(self._items),
+                "max_size": self.max_size,
+                "ttl_seconds": self.ttl,
+                "persistent": bool(self.db_path),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / total, 3) if total else 0.0,
+            }
+
+
+def cache_from_env(db_path: Union[str, Path]) -> AnswerCache:
+    persist = os.getenv("ANSWER_CACHE_PERSIST", "0").lower() in ("1", "true", "yes")
+    return AnswerCache(
+        max_size=int(os.getenv("ANSWER_CACHE_SIZE", "512")),
+        ttl=float(os.getenv("ANSWER_CACHE_TTL", "3600")),
+        db_path=db_path if persist else None,
+    )
@@ -1,6 +1,6 @@
 # app/api/schemas.py
 from pydantic import BaseModel, Field
-from typing import List, Dict
+from typing import List, Dict, Optional
 
 class ChatTurn(BaseModel):
     role: str
@@ -10,7 +10,24 @@ class ChatRequest(BaseModel):
     message: str
     history: List[ChatTurn] = Field(default_factory=list)
     k: int = 4
+    conversation_id: Optional[str] = None
 
 class ChatResponse(BaseModel):
     reply: str
-    history: List[ChatTurn]
\ No newline at end of file
+    history: List[ChatTurn]
+    conversation_id: Optional[str] = None
+
+class BatchChatRequest(BaseModel):
+    queries: List[str]
+    concurrency: Optional[int] = None
+    timeout: Optional[float] = None
+
+class BatchChatItem(BaseModel):
+    query: str
+    response: Optional[str] = None
+    error: Optional[str] = None
+    cached: bool = False
+
+class BatchChatResponse(BaseModel):
+    success: bool
+    results: List[BatchChatItem]
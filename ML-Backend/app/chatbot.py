@@ -0,0 +1,246 @@
+# app/chatbot.py
+"""
+Syllabus retrieval for the chat routes.
+
+Each subject is split into unit-level chunks (one per module unit, plus one
+for its textbooks and one for its reference books), embedded with the
+configured backend from app.embeddings and stored in a FAISS inner-product
+index that can be updated one subject at a time. Queries only send the top-k chunks to Gemini, so prompt size no
+longer grows with the number of subjects.
+"""
+
+import re
+import asyncio
+import threading
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+import numpy as np
+
+from app.database_utils import get_structured
+from app.embeddings import get_embedder
+from app.gemini_client import ask_gemini_async, ask_gemini_stream_async
+from app.syllabus_context import build_syllabus_prompt
+
+try:
+    import faiss  # type: ignore
+except Exception:
+    faiss = None  # type: ignore
+
+DEFAULT_TOP_K = 4
+
+_embedder = None
+_index = None
+_chunks: Dict[int, Dict[str, Any]] = {}
+_lock = threading.Lock()
+
+
+def init_chatbot():
+    global _embedder
+    if _embedder is None:
+        _embedder = get_embedder()
+        if faiss is None:
+            print("ℹ️ faiss not installed. Falling back to numpy search for RAG.")
+
+
+# -------------------- Chunking --------------------
+
+
+def _format_books(label: str, books: List[Dict[str, str]]) -> str:
+    lines = []
+    for b in books:
+        parts = [b.get("title", "")]
+        for key in ("authors", "edition", "publisher"):
+            if b.get(key):
+                parts.append(b[key])
+        lines.append("- " + ", ".join(p for p in parts if p))
+    return f"{label}:\n" + "\n".join(lines)
+
+
+def chunk_subject(row: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """
+    Split one syllabus row into retrievable chunks. Falls back to paragraph
+    chunks of the OCR text when the structured parser finds no modules.
+    """
+    name = row["name"]
+    subject_id = row.get("id")
+    structured = get_structured(row) if subject_id else {}
+    chunks: List[Dict[str, Any]] = []
+
+    def add(text: str, module_no=None, unit_no=None):
+        chunks.append({
+            "subject_id": subject_id,
+            "subject": name,
+            "module_no": module_no,
+            "unit_no": unit_no,
+            "text": text,
+        })
+
+    for mod in structured.get("modules", []):
+        header = f"Subject: {name}\nModule {mod.get('module_no')}: {mod.get('title', '')}"
+        units = mod.get("units", [])
+        if not units:
+            add(header, module_no=mod.get("module_no"))
+        for u in units:
+            add(f"{header}\nUnit {u.get('unit_no')}: {u.get('content', '')}",
+                module_no=mod.get("module_no"), unit_no=u.get("unit_no"))
+
+    if structured.get("textbooks"):
+        add(f"Subject: {name}\n" +
+            _format_books("Textbooks", structured["textbooks"]))
+    if structured.get("reference_books"):
+        add(f"Subject: {name}\n" +
+            _format_books("Reference Books", structured["reference_books"]))
+
+    if not chunks:
+        for para in re.split(r"\n\s*\n", row.get("text") or ""):
+            para = para.strip()
+            if len(para) > 20:
+                add(f"Subject: {name}\n{para}")
+
+    return chunks
+
+
+# -------------------- Index --------------------
+# Chunks are stored under int64 ids in a FAISS IndexIDMap2, with a
+# subject -> chunk ids map so one subject can be added, replaced or removed
+# without re-embedding the rest of the corpus.
+
+_subject_chunk_ids: Dict[str, List[int]] = {}
+_next_id = 0
+
+
+def _new_index(dim: int):
+    if faiss is None:
+        return None
+    return faiss.IndexIDMap2(faiss.IndexFlatIP(dim))
+
+
+def _subject_key(row: Dict[str, Any]) -> str:
+    return row.get("id") or row["name"]
+
+
+def _embed_chunks(chunks: List[Dict[str, Any]]):
+    if not chunks:
+        return np.zeros((0, _embedder.dim), dtype="float32")
+    return _embedder.embed([c["text"] for c in chunks])
+
+
+def _remove_locked(key: str) -> int:
+    ids = _subject_chunk_ids.pop(key, [])
+    if ids and _index is not None:
+        _index.remove_ids(np.array(ids, dtype="int64"))
+    for i in ids:
+        _chunks.pop(i, None)
+    return len(ids)
+
+
+def _add_locked(key: str, chunks: List[Dict[str, Any]], vectors):
+    global _next_id
+    ids = list(range(_next_id, _next_id + len(chunks)))
+    _next_id += len(chunks)
+    if ids and _index is not None:
+        _index.add_with_ids(vectors, np.array(ids, dtype="int64"))
+    for i, c, v in zip(ids, chunks, vectors):
+        c["_vec"] = v
+        _chunks[i] = c
+    _subject_chunk_ids[key] = ids
+
+
+def _ensure_index_locked():
+    global _index
+    if _index is None:
+        _index = _new_index(_embedder.dim)
+
+
+def upsert_subject(row: Dict[str, Any]) -> int:
+    """Add a subject's chunks to the index, replacing any it already had."""
+    init_chatbot()
+    chunks = chunk_subject(row)
+    vectors = _embed_chunks(chunks)
+    key = _subject_key(row)
+    with _lock:
+        _ensure_index_locked()
+        _remove_locked(key)
+        _add_locked(key, chunks, vectors)
+    return len(chunks)
+
+
+def remove_subject(subject_id: str) -> int:
+    with _lock:
+        return _remove_locked(subject_id)
+
+
+def rebuild_rag_index(syllabus_data: List[Dict[str, Any]]):
+    global _index, _chunks, _subject_chunk_ids, _next_id
+    init_chatbot()
+
+    prepared = []
+    for row in syllabus_data:
+        chunks = chunk_subject(row)
+        prepared.append((_subject_key(row), chunks, _embed_chunks(chunks)))
+
+    with _lock:
+        _index = _new_index(_embedder.dim)
+        _chunks, _subject_chunk_ids, _next_id = {}, {}, 0
+        for key, chunks, vectors in prepared:
+            _add_locked(key, chunks, vectors)
+        total = len(_chunks)
+    print(f"✅ RAG index built: {total} chunks from {len(syllabus_data)} subjects.")
+
+
+def search(query: str, k: int = DEFAULT_TOP_K) -> List[Dict[str, Any]]:
+    init_chatbot()
+    qv = _embedder.embed([query])
+    with _lock:
+        if not _chunks or k <= 0:
+            return []
+        k = min(k, len(_chunks))
+        if _index is not None:
+            scores, ids = _index.search(qv, k)
+            hits = [(float(s), int(i))
+                    for s, i in zip(scores[0], ids[0]) if i >= 0]
+        else:
+            ids = list(_chunks.keys())
+            mat = np.stack([_chunks[i]["_vec"] for i in ids])
+            sims = mat @ qv[0]
+            top = np.argsort(-sims)[:k]
+            hits = [(float(sims[j]), ids[j]) for j in top]
+        found = [(score, _chunks[i]) for score, i in hits if i in _chunks]
+
+    results = []
+    for score, chunk in found:
+        c = {key: v for key, v in chunk.items() if key != "_vec"}
+        c["score"] = score
+        results.append(c)
+    return results
+
+
+def retrieve_context(query: str, k: int = DEFAULT_TOP_K) -> Optional[str]:
+    """Top-k chunks joined into a prompt context, or None if the index is empty."""
+    hits = search(query, k)
+    if not hits:
+        return None
+    return "\n\n".join(h["text"] for h in hits)
+
+
+# -------------------- Query handling --------------------
+
+
+def _prompt_for(query: str, use_rag: bool, k: int) -> str:
+    if not use_rag:
+        return query
+    context = retrieve_context(query, k)
+    if context is None:
+        return query
+    return build_syllabus_prompt(context, query)
+
+
+async def process_user_query(query: str, use_rag: bool = True, k: int = DEFAULT_TOP_K) -> str:
+    prompt = await asyncio.to_thread(_prompt_for, query, use_rag, k)
+    return await ask_gemini_async(prompt, priority="syllabus" if use_rag else "general")
+
+
+async def process_user_query_stream(query: str, use_rag: bool = True, k: int = DEFAULT_TOP_K) -> AsyncIterator[str]:
+    prompt = await asyncio.to_thread(_prompt_for, query, use_rag, k)
+    async for token in ask_gemini_stream_async(prompt, priority="syllabus" if use_rag else "general"):
+        yield token
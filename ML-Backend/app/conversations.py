@@ -0,0 +1,190 @@
+# app/conversations.py
+"""
+Server-side memory for multi-turn syllabus chat.
+
+Turns are stored per conversation id in SQLite. Only the most recent turns
+that fit HISTORY_TOKEN_BUDGET are sent verbatim; older turns are folded into
+a running summary (by Gemini at batch priority, or a plain truncation if the
+model is unavailable), so prompt size stays flat over long sessions.
+"""
+
+import os
+import sqlite3
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple, Union
+from uuid import uuid4
+
+from fastapi.concurrency import run_in_threadpool
+
+from app.db import pool_for
+from app.gemini_client import ask_gemini_async, is_error_reply
+from app.llm_scheduler import QueueFull
+from app.syllabus_context import estimate_tokens
+
+
+HISTORY_TOKEN_BUDGET = int(os.getenv("HISTORY_TOKEN_BUDGET", "1500"))
+HISTORY_MIN_TURNS = int(os.getenv("HISTORY_MIN_TURNS", "4"))
+SUMMARY_TOKEN_BUDGET = int(os.getenv("SUMMARY_TOKEN_BUDGET", "400"))
+
+
+class ConversationStore:
+    def __init__(self, db_path: Union[str, Path]):
+        self.db_path = db_path
+        self.db = pool_for(db_path)
+        with self.db.connection() as con:
+            con.execute(
+                """
+                CREATE TABLE IF NOT EXISTS conversations (
+                    id TEXT PRIMARY KEY,
+                    summary TEXT NOT NULL DEFAULT '',
+                    created_at TEXT NOT NULL,
+                    updated_at TEXT NOT NULL
+                );
+                """
+            )
+            con.execute(
+                """
+                CREATE TABLE IF NOT EXISTS conversation_turns (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    conversation_id TEXT NOT NULL,
+                    role TEXT NOT NULL,
+                    content TEXT NOT NULL,
+                    folded INTEGER NOT NULL DEFAULT 0,
+                    created_at TEXT NOT NULL
+                );
+                """
+            )
+            con.execute(
+                "CREATE INDEX IF NOT EXISTS idx_turns_conversation ON conversation_turns (conversation_id, folded, id)")
+            con.commit()
+
+    def ensure(self, conversation_id: Optional[str]) -> str:
+        cid = conversation_id or str(uuid4())
+        now = datetime.utcnow().isoformat()
+        with self.db.connection() as con:
+            con.execute(
+                "INSERT OR IGNORE INTO conversations (id, summary, created_at, updated_at) VALUES (?, '', ?, ?)",
+                (cid, now, now),
+            )
+            con.commit()
+        return cid
+
+    def load(self, conversation_id: str) -> Tuple[str, List[Dict[str, Any]]]:
+        """Running summary plus the turns not yet folded into it."""
+        with self.db.connection() as con:
+            con.row_factory = sqlite3.Row
+            row = con.execute(
+                "SELECT summary FROM conversations WHERE id = ?", (conversation_id,)).fetchone()
+            turns = con.execute(
+                "SELECT id, role, content FROM conversation_turns WHERE conversation_id = ? AND folded = 0 ORDER BY id",
+                (conversation_id,),
+            ).fetchall()
+        return (row["summary"] if row else ""), [dict(t) for t in turns]
+
+    def append(self, conversation_id: str, turns: List[Tuple[str, str]]):
+        now = datetime.utcnow().isoformat()
+        with self.db.connection() as con:
+            con.executemany(
+                "INSERT INTO conversation_turns (conversation_id, role, content, created_at) VALUES (?, ?, ?, ?)",
+                [(conversation_id, role, content, now) for role, content in turns],
+            )
+            con.execute(
+                "UPDATE conversations SET updated_at = ? WHERE id = ?", (now, conversation_id))
+            con.commit()
+
+    def fold(self, conversation_id: str, turn_ids: List[int], summary: str, previous: str) -> bool:
+        """
+        Replace the summary and mark turn_ids folded, but only if the summary
+        is still `previous` (what load() returned) and none of the turns were
+        folded meanwhile. Returns False, changing nothing, if another fold won.
+        """
+        with self.db.connection() as con:
+            cur = con.execute(
+                "UPDATE conversations SET summary = ?, updated_at = ? WHERE id = ? AND summary = ?",
+                (summary, datetime.utcnow().isoformat(), conversation_id, previous),
+            )
+            if cur.rowcount != 1:
+                con.rollback()
+                return False
+            cur = con.executemany(
+                "UPDATE conversation_turns SET folded = 1 WHERE id = ? AND conversation_id = ? AND folded = 0",
+                [(tid, conversation_id) for tid in turn_ids],
+            )
+            if cur.rowcount != len(turn_ids):
+                con.rollback()
+                return False
+            con.commit()
+        return True
+
+
+def split_recent(turns: List[Dict[str, Any]], budget: int = None,
+                 min_turns: int = None) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+    """Split turns into (older, recent) where recent fits the token budget."""
+    budget = budget or HISTORY_TOKEN_BUDGET
+    min_turns = min_turns or HISTORY_MIN_TURNS
+    used = 0
+    cut = len(turns)
+    for i in range(len(turns) - 1, -1, -1):
+        cost = estimate_tokens(turns[i]["content"])
+        if used + cost > budget and len(turns) - i > min_turns:
+            break
+        used += cost
+        cut = i
+    return turns[:cut], turns[cut:]
+
+
+def format_history(summary: str, turns: List[Dict[str, Any]]) -> str:
+    parts = []
+    if summary:
+        parts.append(f"Summary of earlier conversation:\n{summary}")
+    if turns:
+        parts.append("Recent messages:\n" + "\n".join(
+            f"{t['role']}: {t['content']}" for t in turns))
+    return "\n\n".join(parts)
+
+
+def _truncate_summary(summary: str, turns: List[Dict[str, Any]]) -> str:
+    text = "\n".join(([summary] if summary else []) +
+                     [f"{t['role']}: {t['content']}" for t in turns])
+    limit = SUMMARY_TOKEN_BUDGET * 4
+    return text[-limit:]
+
+
+async def summarize(summary: str, turns: List[Dict[str, Any]]) -> str:
+    transcript = "\n".join(f"{t['role']}: {t['content']}" for t in turns)
+    prompt = f"""
+Update the running summary of a student's conversation with a syllabus assistant.
+Keep subjects, modules, units and open questions the student cares about.
+Write at most {SUMMARY_TOKEN_BUDGET * 3 // 4} words of plain text.
+
+Current summary:
+{summary or "(none)"}
+
+New messages to fold in:
+{transcript}
+"""
+    try:
+        reply = await ask_gemini_async(prompt, priority="batch")
+    except QueueFull:
+        reply = ""
+    if not reply or is_error_reply(reply):
+        return _truncate_summary(summary, turns)
+    return reply.strip()
+
+
+async def compact(store: ConversationStore, conversation_id: str):
+    """
+    Fold turns that no longer fit the verbatim budget into the summary. If
+    another compaction of the same conversation lands first, this one is
+    dropped; the turns it would have folded are picked up next time.
+    """
+    summary, turns = await run_in_threadpool(store.load, conversation_id)
+    older, _ = split_recent(turns)
+    if not older:
+        return
+    new_summary = await summarize(summary, older)
+    folded = await run_in_threadpool(
+        store.fold, conversation_id, [t["id"] for t in older], new_summary, summary)
+    if not folded:
+        print(f"ℹ️ Conversation {conversation_id} was compacted concurrently; skipped.")
@@ -1,23 +1,73 @@
 # app/database_utils.py
 
+import os
 import sqlite3
 import json
+import hashlib
 from pathlib import Path
+from typing import Any, Dict
 
-DATA_DIR = Path(__file__).parent / "data" / "syllabus"
-DB_PATH = DATA_DIR / "db.sqlite3"
+from app.db import pool_for
+from app.syllabus_parser import PARSER_VERSION, parse_syllabus_structured
+from app.syllabus_search import index_subject
+
+# Same DB file main.py writes uploads to
+DB_PATH = Path(os.getenv("SYLLABUS_DB_PATH") or Path(__file__).resolve().parent.parent / "database.sqlite3")
+db = pool_for(DB_PATH)
 
 def list_subjects():
-    with sqlite3.connect(DB_PATH) as con:
+    with db.connection() as con:
         con.row_factory = sqlite3.Row
         rows = con.execute("SELECT id, name, created_at FROM syllabus ORDER BY created_at DESC").fetchall()
         return [dict(r) for r in rows]
 
 def get_subject_by_name(subject_name: str):
-    with sqlite3.connect(DB_PATH) as con:
+    with db.connection() as con:
         con.row_factory = sqlite3.Row
         row = con.execute(
-            "SELECT id, name, text, created_at, outline_json FROM syllabus WHERE LOWER(name)=LOWER(?)",
+            "SELECT id, name, text, created_at, outline_json, structured_json, parser_version FROM syllabus WHERE LOWER(name)=LOWER(?)",
             (subject_name.strip(),)
         ).fetchone()
         return dict(row) if row else None
+
+def save_structured(subject_id: str, structured: Dict[str, Any]):
+    """Store the parse and refresh the subject's search rows in one transaction."""
+    with db.connection() as con:
+        con.execute(
+            "UPDATE syllabus SET structured_json = ?, parser_version = ? WHERE id = ?",
+            (json.dumps(structured, ensure_ascii=False), PARSER_VERSION, subject_id),
+        )
+        row = con.execute("SELECT name FROM syllabus WHERE id = ?", (subject_id,)).fetchone()
+        if row:
+            index_subject(con, subject_id, row[0], structured)
+        con.commit()
+
+def get_structured(row: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Return the persisted modules/textbooks/reference_books for a subject row.
+    Rows parsed by an older parser (or never parsed) are re-parsed and stored.
+    """
+    if row.get("structured_json") and row.get("parser_version") == PARSER_VERSION:
+        try:
+            return json.loads(row["structured_json"])
+        except ValueError:
+            pass
+
+    structured = parse_syllabus_structured(row.get("text") or "")
+    try:
+        save_structured(row["id"], structured)
+    except Exception as e:
+        print(f"⚠️ Could not save structured syllabus: {e}")
+    return structured
+
+def syllabus_fingerprint() -> str:
+    """Content hash of every subject's parsed syllabus, stable across restarts."""
+    h = hashlib.sha1(str(PARSER_VERSION).encode())
+    with db.connection() as con:
+        rows = con.execute(
+            "SELECT id, name, COALESCE(structured_json, text) FROM syllabus ORDER BY id").fetchall()
+    for row in rows:
+        for value in row:
+            h.update((value or "").encode("utf-8"))
+            h.update(b"\x1f")
+    return h.hexdigest()
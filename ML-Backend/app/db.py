@@ -0,0 +1,158 @@
+# app/db.py
+"""
+Shared SQLite access for the syllabus DB and the stores that live in it.
+
+Instead of sqlite3.connect() per call, helpers borrow a long-lived connection
+from a small per-file pool:
+
+    with pool_for(DB_PATH).connection() as con:
+        con.execute(...)
+
+The block commits on success and rolls back on error, like
+`with sqlite3.connect(...)`. Connections are opened in WAL mode, so readers
+are not blocked by an upload or reparse writing. They use synchronous=NORMAL
+and a larger page cache and mmap window. Because each connection lives on,
+sqlite3's per-connection statement cache means repeated queries skip
+re-preparing.
+"""
+
+import os
+import time
+import sqlite3
+import threading
+from collections import deque
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Deque, Dict, Iterator, List, Optional, Union
+
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "8"))
+# How long a writer waits for the lock (and a caller for a free connection)
+DB_BUSY_TIMEOUT_MS = int(os.getenv("DB_BUSY_TIMEOUT_MS", "5000"))
+# Page cache per connection, in KiB
+DB_CACHE_KIB = int(os.getenv("DB_CACHE_KIB", "16384"))
+DB_MMAP_BYTES = int(os.getenv("DB_MMAP_BYTES", str(128 * 1024 * 1024)))
+# Prepared statements kept per connection
+DB_STATEMENT_CACHE = int(os.getenv("DB_STATEMENT_CACHE", "256"))
+
+
+class ConnectionPool:
+    def __init__(self, path: Union[str, Path], size: int = None):
+        self.path = str(path)
+        self.size = max(1, size or DB_POOL_SIZE)
+        self._idle: List[sqlite3.Connection] = []
+        self._open = 0
+        # Callers waiting for a connection, served first come first served: a
+        # released connection goes straight into the oldest waiter's slot
+        # (None in a slot means "open a new one"), so busy readers can't
+        # starve a writer.
+        self._waiters: Deque[List[Optional[sqlite3.Connection]]] = deque()
+        self._cond = threading.Condition()
+
+    def _connect(self) -> sqlite3.Connection:
+        con = sqlite3.connect(
+            self.path, timeout=DB_BUSY_TIMEOUT_MS / 1000.0,
+            check_same_thread=False, cached_statements=DB_STATEMENT_CACHE)
+        con.execute("PRAGMA journal_mode=WAL")
+        con.execute("PRAGMA synchronous=NORMAL")
+        con.execute(f"PRAGMA cache_size=-{DB_CACHE_KIB}")
+        con.execute(f"PRAGMA mmap_size={DB_MMAP_BYTES}")
+        con.execute("PRAGMA temp_store=MEMORY")
+        return con
+
+    def _acquire(self) -> sqlite3.Connection:
+        with self._cond:
+            if not self._waiters and self._idle:
+                return self._idle.pop()
+            if not self._waiters and self._open < self.size:
+                self._open += 1
+                con = None
+            else:
+                slot: List[Optional[sqlite3.Connection]] = []
+                self._waiters.append(slot)
+                deadline = time.monotonic() + DB_BUSY_TIMEOUT_MS / 1000.0
+                while not slot:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self._waiters.remove(slot)
+                        raise sqlite3.OperationalError(f"No free connection to {self.path}")
+                    self._cond.wait(remaining)
+                con = slot[0]
+        if con is not None:
+            return con
+        try:
+            return self._connect()
+        except Exception:
+            self._discard(None)
+            raise
+
+    def _handoff(self, con: Optional[sqlite3.Connection]) -> bool:
+        # Caller holds self._cond
+        if not self._waiters:
+            return False
+        self._waiters.popleft().append(con)
+        self._cond.notify_all()
+        return True
+
+    def _discard(self, con):
+        if con is not None:
+            try:
+                con.close()
+            except Exception:
+                pass
+        with self._cond:
+            if not self._handoff(None):
+                self._open -= 1
+
+    def _release(self, con: sqlite3.Connection):
+        con.row_factory = None
+        with self._cond:
+            if not self._handoff(con):
+                self._idle.append(con)
+
+    @contextmanager
+    def connection(self) -> Iterator[sqlite3.Connection]:
+        con = self._acquire()
+        try:
+            yield con
+            if con.in_transaction:
+                con.commit()
+        except BaseException:
+            try:
+                if con.in_transaction:
+                    con.rollback()
+            except Exception:
+                # Unusable connection: don't hand it out again
+                self._discard(con)
+                raise
+            self._release(con)
+            raise
+        self._release(con)
+
+    def close(self):
+        with self._cond:
+            idle, self._idle = self._idle, []
+            self._open -= len(idle)
+        for con in idle:
+            con.close()
+
+
+_pools: Dict[str, ConnectionPool] = {}
+_pools_lock = threading.Lock()
+
+
+def pool_for(path: Union[str, Path]) -> ConnectionPool:
+    """The process-wide pool for a DB file (one per resolved path)."""
+    key = str(Path(path).resolve())
+    with _pools_lock:
+        pool = _pools.get(key)
+        if pool is None:
+            pool = _pools[key] = ConnectionPool(key)
+        return pool
+
+
+def close_pools():
+    """Close idle connections (checkpoints the WAL); call on shutdown."""
+    with _pools_lock:
+        pools = list(_pools.values())
+    for pool in pools:
+        pool.close()
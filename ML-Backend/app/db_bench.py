@@ -0,0 +1,167 @@
+# app/db_bench.py
+"""
+Concurrent read/write benchmark for the syllabus DB access layer.
+
+    python -m app.db_bench --seconds 5
+    python -m app.db_bench --mix 8:0 --mix 8:2 --mix 4:4 --json
+
+Each mix is READERS:WRITERS threads hammering a temporary copy of the DB for
+--seconds. Readers fetch a subject the way the read endpoints do: the full
+row, a few metadata columns, or the subject list. Writers update a subject's
+outline_json, as an upload or reparse does. Every mix runs twice. "connect"
+is the old pattern: a fresh sqlite3.connect() per call on a rollback-journal
+DB. "pool" is app.db: pooled WAL connections. The report gives throughput,
+p50/p95/p99 latency and lock errors per side.
+"""
+
+import sys
+import json
+import time
+import random
+import shutil
+import sqlite3
+import argparse
+import tempfile
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Dict, List, Tuple
+
+from app.database_utils import DB_PATH
+from app.db import ConnectionPool, DB_BUSY_TIMEOUT_MS
+from app.loadtest import percentile
+
+# Only columns every schema version has, so any copy of the DB works
+READS = [
+    ("SELECT id, name, text, created_at, outline_json FROM syllabus WHERE id = ?", True),
+    ("SELECT id, created_at FROM syllabus WHERE id = ?", True),
+    ("SELECT id, name, created_at FROM syllabus ORDER BY created_at DESC", False),
+]
+WRITE = "UPDATE syllabus SET outline_json = ? WHERE id = ?"
+
+
+def _connect_per_call(path: str):
+    @contextmanager
+    def connection():
+        con = sqlite3.connect(path, timeout=DB_BUSY_TIMEOUT_MS / 1000.0)
+        try:
+            with con:
+                yield con
+        finally:
+            con.close()
+    return connection
+
+
+def _side(latencies: List[float], errors: int, elapsed: float) -> Dict[str, Any]:
+    def ms(v):
+        return round(v * 1000, 2) if v is not None else None
+
+    return {
+        "ops": len(latencies),
+        "ops_per_s": round(len(latencies) / elapsed, 1) if elapsed else 0.0,
+        "errors": errors,
+        "latency_ms": {p: ms(percentile(latencies, q)) for p, q in (("p50", 50), ("p95", 95), ("p99", 99))},
+    }
+
+
+def run_mix(connection, ids: List[str], readers: int, writers: int, seconds: float, seed: int) -> Dict[str, Any]:
+    stop = time.perf_counter() + seconds
+    results: Dict[str, List[Tuple[List[float], int]]] = {"read": [], "write": []}
+    lock = threading.Lock()
+
+    def worker(kind: str, wid: int):
+        rng = random.Random(seed * 1000 + wid)
+        lat: List[float] = []
+        errors = 0
+        while time.perf_counter() < stop:
+            start = time.perf_counter()
+            try:
+                with connection() as con:
+                    if kind == "read":
+                        sql, by_id = rng.choice(READS)
+                        con.execute(sql, (rng.choice(ids),) if by_id else ()).fetchall()
+                    else:
+                        con.execute(WRITE, (json.dumps({"chapters": [], "n": rng.random()}), rng.choice(ids)))
+                lat.append(time.perf_counter() - start)
+            except sqlite3.OperationalError as e:
+                # Lock/busy timeouts are the result being measured; anything else is a bug
+                if "locked" not in str(e) and "busy" not in str(e) and "No free connection" not in str(e):
+                    raise
+                errors += 1
+        with lock:
+            results[kind].append((lat, errors))
+
+    threads = [threading.Thread(target=worker, args=("read", i)) for i in range(readers)]
+    threads += [threading.Thread(target=worker, args=("write", readers + i)) for i in range(writers)]
+    begin = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - begin
+
+    out = {}
+    for kind, parts in results.items():
+        if parts:
+            out[kind] = _side([x for lat, _ in parts for x in lat], sum(e for _, e in parts), elapsed)
+    return out
+
+
+def bench(db_path, mixes: List[Tuple[int, int]], seconds: float, seed: int) -> Dict[str, Any]:
+    report: Dict[str, Any] = {"seconds": seconds, "mixes": []}
+    with tempfile.TemporaryDirectory() as tmpdir:
+        for mode in ("connect", "pool"):
+            copy = str(Path(tmpdir) / f"{mode}.sqlite3")
+            shutil.copy(db_path, copy)
+            with sqlite3.connect(copy) as con:
+                con.execute("PRAGMA journal_mode=DELETE")
+                ids = [r[0] for r in con.execute("SELECT id FROM syllabus").fetchall()]
+            if not ids:
+                raise SystemExit(f"❌ No subjects in {db_path}")
+
+            pool = ConnectionPool(copy) if mode == "pool" else None
+            connection = pool.connection if pool else _connect_per_call(copy)
+            for readers, writers in mixes:
+                report["mixes"].append({
+                    "mode": mode, "readers": readers, "writers": writers,
+                    **run_mix(connection, ids, readers, writers, seconds, seed),
+                })
+            if pool:
+                pool.close()
+    return report
+
+
+def _mix(value: str) -> Tuple[int, int]:
+    readers, _, writers = value.partition(":")
+    return int(readers), int(writers or 0)
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    ap.add_argument("--db", default=str(DB_PATH), help="DB to copy for the benchmark")
+    ap.add_argument("--mix", action="append", type=_mix, help="READERS:WRITERS (repeatable)")
+    ap.add_argument("--seconds", type=float, default=5.0, help="Duration of each mix")
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("--json", action="store_true", help="Print the raw JSON report")
+    args = ap.parse_args(argv)
+
+    report = bench(args.db, args.mix or [(8, 0), (8, 2), (4, 4)], args.seconds, args.seed)
+    if args.json:
+        print(json.dumps(report, indent=2))
+        return 0
+
+    print(f"\n{'mode':<9}{'mix':>6}{'side':>7}{'ops/s':>10}{'p50':>8}{'p95':>8}{'p99':>8}{'errors':>8}")
+    for m in report["mixes"]:
+        for side in ("read", "write"):
+            r = m.get(side)
+            if not r:
+                continue
+            lat = r["latency_ms"]
+            print(f"{m['mode']:<9}{m['readers']:>3}:{m['writers']:<2}{side:>7}{r['ops_per_s']:>10}"
+                  f"{lat['p50']:>8}{lat['p95']:>8}{lat['p99']:>8}{r['errors']:>8}")
+    print(f"\n{report['seconds']}s per mix; latencies in ms")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
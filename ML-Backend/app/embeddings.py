@@ -0,0 +1,72 @@
+# app/embeddings.py
+"""
+Pluggable text embedders for the syllabus RAG index.
+
+The default "hashing" backend needs nothing beyond numpy and works offline.
+Set RAG_EMBEDDER=sentence-transformers to use the local sentence-transformers
+model named by EMBED_MODEL instead.
+"""
+
+import os
+import re
+import math
+import zlib
+from typing import Callable, Dict, List
+
+import numpy as np
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+
+class HashingEmbedder:
+    """Feature-hashed bag of words + bigrams, L2-normalised."""
+
+    def __init__(self, dim: int = 512):
+        self.dim = dim
+
+    def _features(self, text: str) -> List[str]:
+        words = _TOKEN_RE.findall(text.lower())
+        return words + [f"{a} {b}" for a, b in zip(words, words[1:])]
+
+    def embed(self, texts: List[str]) -> np.ndarray:
+        out = np.zeros((len(texts), self.dim), dtype="float32")
+        for i, text in enumerate(texts):
+            counts: Dict[int, int] = {}
+            for feat in self._features(text):
+                h = zlib.crc32(feat.encode("utf-8")) % self.dim
+                counts[h] = counts.get(h, 0) + 1
+            for h, c in counts.items():
+                out[i, h] = 1.0 + math.log(c)
+        norms = np.linalg.norm(out, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return out / norms
+
+
+class SentenceTransformerEmbedder:
+    def __init__(self, model_name: str):
+        from sentence_transformers import SentenceTransformer  # type: ignore
+        self.model = SentenceTransformer(model_name)
+        self.dim = self.model.get_sentence_embedding_dimension()
+
+    def embed(self, texts: List[str]) -> np.ndarray:
+        vecs = self.model.encode(
+            texts, normalize_embeddings=True, convert_to_numpy=True)
+        return vecs.astype("float32")
+
+
+_BACKENDS: Dict[str, Callable[[], object]] = {
+    "hashing": lambda: HashingEmbedder(int(os.getenv("RAG_EMBED_DIM", "512"))),
+    "sentence-transformers": lambda: SentenceTransformerEmbedder(
+        os.getenv("EMBED_MODEL", "BAAI/bge-small-en-v1.5")),
+}
+
+
+def register_embedder(name: str, factory: Callable[[], object]):
+    _BACKENDS[name] = factory
+
+
+def get_embedder(name: str = None):
+    name = name or os.getenv("RAG_EMBEDDER", "hashing")
+    if name not in _BACKENDS:
+        raise ValueError(f"Unknown embedder backend: {name}")
+    return _BACKENDS[name]()
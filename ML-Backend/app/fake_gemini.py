@@ -0,0 +1,90 @@
+# app/fake_gemini.py
+"""
+Deterministic offline stand-in for the Gemini model.
+
+Implements the parts of GenerativeModel the client uses (generate_content and
+generate_content_async, streaming or not). The reply depends only on the
+prompt and seed; timing is a fixed first-token latency plus a token rate.
+Enable with GEMINI_FAKE=1 (GEMINI_FAKE_LATENCY, GEMINI_FAKE_TPS,
+GEMINI_FAKE_TOKENS) or pass an instance to gemini_client.set_model().
+"""
+
+import os
+import time
+import zlib
+import random
+import asyncio
+from typing import List
+
+_WORDS = (
+    "module unit syllabus topic textbook reference chapter concept overview "
+    "definition example exam lecture assignment practice summary key point"
+).split()
+
+
+class FakeResponse:
+    def __init__(self, text: str):
+        self.text = text
+
+
+class _AsyncStream:
+    def __init__(self, model: "FakeGeminiModel", tokens: List[str]):
+        self.model = model
+        self.tokens = tokens
+
+    async def __aiter__(self):
+        await asyncio.sleep(self.model.latency)
+        for tok in self.tokens:
+            await asyncio.sleep(self.model.token_delay)
+            yield FakeResponse(tok)
+
+
+class FakeGeminiModel:
+    def __init__(self, latency: float = 0.5, tokens_per_sec: float = 50.0,
+                 response_tokens: int = 120, seed: int = 0):
+        self.latency = latency
+        self.tokens_per_sec = tokens_per_sec
+        self.response_tokens = response_tokens
+        self.seed = seed
+        self.calls = 0
+
+    @classmethod
+    def from_env(cls) -> "FakeGeminiModel":
+        return cls(
+            latency=float(os.getenv("GEMINI_FAKE_LATENCY", "0.5")),
+            tokens_per_sec=float(os.getenv("GEMINI_FAKE_TPS", "50")),
+            response_tokens=int(os.getenv("GEMINI_FAKE_TOKENS", "120")),
+        )
+
+    @property
+    def token_delay(self) -> float:
+        return 1.0 / self.tokens_per_sec if self.tokens_per_sec > 0 else 0.0
+
+    def _tokens(self, prompt: str) -> List[str]:
+        rng = random.Random(self.seed ^ zlib.crc32(prompt.encode("utf-8")))
+        return [("" if i == 0 else " ") + rng.choice(_WORDS) for i in range(self.response_tokens)]
+
+    def _total_time(self, n: int) -> float:
+        return self.latency + n * self.token_delay
+
+    def generate_content(self, prompt: str, stream: bool = False, **kwargs):
+        self.calls += 1
+        tokens = self._tokens(prompt)
+        if not stream:
+            time.sleep(self._total_time(len(tokens)))
+            return FakeResponse("".join(tokens))
+
+        def gen():
+            time.sleep(self.latency)
+            for tok in tokens:
+                time.sleep(self.token_delay)
+                yield FakeResponse(tok)
+        return gen()
+
+    async def generate_content_async(self, prompt: str, stream: bool = False, **kwargs):
+        self.calls += 1
+        tokens = self._tokens(prompt)
+        if not stream:
+            await asyncio.sleep(self._total_time(len(tokens)))
+            return FakeResponse("".join(tokens))
+        return _AsyncStream(self, tokens)
@@ -1,18 +1,199 @@
 import os
+import asyncio
+import random
+from typing import AsyncIterator, Iterator
 from dotenv import load_dotenv
 import google.generativeai as genai
+from app.llm_scheduler import scheduler
+
+try:
+    from google.api_core import exceptions as gexc  # type: ignore
+    _RETRYABLE_API_ERRORS = (
+        gexc.TooManyRequests,
+        gexc.ResourceExhausted,
+        gexc.ServiceUnavailable,
+        gexc.InternalServerError,
+        gexc.DeadlineExceeded,
+    )
+except Exception:
+    _RETRYABLE_API_ERRORS = ()
 
 # Load .env variables
 load_dotenv()
 
 genai.configure(api_key=os.getenv("GEMINI_API_KEY"))
 
+GEMINI_MODEL = os.getenv("GEMINI_MODEL", "gemini-2.5-flash")
+GEMINI_TIMEOUT = float(os.getenv("GEMINI_TIMEOUT", "60"))
+GEMINI_MAX_RETRIES = int(os.getenv("GEMINI_MAX_RETRIES", "2"))
+GEMINI_RETRY_BASE = float(os.getenv("GEMINI_RETRY_BASE", "0.5"))
+GEMINI_MAX_CONCURRENCY = int(os.getenv("GEMINI_MAX_CONCURRENCY", "8"))
+
+RETRYABLE_ERRORS = (asyncio.TimeoutError, ConnectionError) + _RETRYABLE_API_ERRORS
+
+# One long-lived model object; tests and local runs can swap in a fake with
+# the same generate_content() interface via set_model().
+_model = None
+_model_override = None
+
+_semaphore = None
+_semaphore_loop = None
+
+
+def is_error_reply(reply: str) -> bool:
+    return reply.startswith("Gemini API error:")
+
+
+def set_model(model):
+    global _model_override
+    _model_override = model
+
+
+if os.getenv("GEMINI_FAKE", "0").lower() in ("1", "true", "yes"):
+    from app.fake_gemini import FakeGeminiModel
+    set_model(FakeGeminiModel.from_env())
+    print("ℹ️ GEMINI_FAKE set: using the offline fake Gemini model.")
+
+
+def _get_model():
+    global _model
+    if _model_override is not None:
+        return _model_override
+    if _model is None:
+        name = GEMINI_MODEL if GEMINI_MODEL.startswith("models/") else f"models/{GEMINI_MODEL}"
+        _model = genai.GenerativeModel(name)
+    return _model
+
+
+def _request_kwargs():
+    # Fakes only need to implement generate_content(prompt, stream=...)
+    if _model_override is not None:
+        return {}
+    return {"request_options": {"timeout": GEMINI_TIMEOUT}}
+
+
+def _get_semaphore() -> asyncio.Semaphore:
+    global _semaphore, _semaphore_loop
+    loop = asyncio.get_running_loop()
+    if _semaphore is None or _semaphore_loop is not loop:
+        _semaphore = asyncio.Semaphore(GEMINI_MAX_CONCURRENCY)
+        _semaphore_loop = loop
+    return _semaphore
+
+
+def _backoff(attempt: int) -> float:
+    # Exponential backoff with full jitter, capped at 8s
+    return random.uniform(0, min(8.0, GEMINI_RETRY_BASE * (2 ** attempt)))
+
+
+# -------------------- Sync (scripts / worker threads) --------------------
+
 
 def ask_gemini(prompt: str) -> str:
     try:
-        model = genai.GenerativeModel("models/gemini-2.5-flash")
-        result = model.generate_content(prompt)
+        model = _get_model()
+        result = model.generate_content(prompt, **_request_kwargs())
         return result.text
     except Exception as e:
         print("🔥 GEMINI ERROR:", e)
         return f"Gemini API error: {e}"
+
+
+def ask_gemini_stream(prompt: str) -> Iterator[str]:
+    """Yield response text chunks as Gemini generates them."""
+    try:
+        model = _get_model()
+        for chunk in model.generate_content(prompt, stream=True, **_request_kwargs()):
+            try:
+                text = chunk.text
+            except ValueError:
+                # chunk carries no text part (e.g. safety metadata only)
+                continue
+            if text:
+                yield text
+    except Exception as e:
+        print("🔥 GEMINI ERROR:", e)
+        yield f"Gemini API error: {e}"
+
+
+# -------------------- Async (request handlers) --------------------
+
+
+async def _generate_async(model, prompt: str, stream: bool):
+    if hasattr(model, "generate_content_async"):
+        return await model.generate_content_async(prompt, stream=stream, **_request_kwargs())
+    return await asyncio.to_thread(model.generate_content, prompt, stream=stream, **_request_kwargs())
+
+
+async def _aiter_chunks(response) -> AsyncIterator:
+    if hasattr(response, "__aiter__"):
+        async for chunk in response:
+            yield chunk
+        return
+    it = iter(response)
+    done = object()
+    while True:
+        chunk = await asyncio.to_thread(next, it, done)
+        if chunk is done:
+            return
+        yield chunk
+
+
+async def ask_gemini_async(prompt: str, priority: str = "general") -> str:
+    """
+    Non-blocking ask_gemini(): admitted by the scheduler at `priority`,
+    bounded by GEMINI_MAX_CONCURRENCY, each attempt limited to GEMINI_TIMEOUT
+    seconds, transient errors retried with jitter. Raises QueueFull when the
+    scheduler's queue is full.
+    """
+    model = _get_model()
+    for attempt in range(GEMINI_MAX_RETRIES + 1):
+        await scheduler.acquire(priority)
+        try:
+            async with _get_semaphore():
+                result = await asyncio.wait_for(
+                    _generate_async(model, prompt, stream=False), GEMINI_TIMEOUT)
+            return result.text
+        except RETRYABLE_ERRORS as e:
+            if attempt >= GEMINI_MAX_RETRIES:
+                print("🔥 GEMINI ERROR:", e)
+                return f"Gemini API error: {e}"
+            delay = _backoff(attempt)
+            print(f"⚠️ Gemini call failed ({e!r}), retrying in {delay:.2f}s")
+            await asyncio.sleep(delay)
+        except Exception as e:
+            print("🔥 GEMINI ERROR:", e)
+            return f"Gemini API error: {e}"
+
+
+async def ask_gemini_stream_async(prompt: str, priority: str = "general") -> AsyncIterator[str]:
+    """Async ask_gemini_stream(); retries only until the first chunk arrives."""
+    model = _get_model()
+    for attempt in range(GEMINI_MAX_RETRIES + 1):
+        await scheduler.acquire(priority)
+        started = False
+        try:
+            async with _get_semaphore():
+                response = await asyncio.wait_for(
+                    _generate_async(model, prompt, stream=True), GEMINI_TIMEOUT)
+                async for chunk in _aiter_chunks(response):
+                    try:
+                        text = chunk.text
+                    except ValueError:
+                        continue
+                    if text:
+                        started = True
+                        yield text
+            return
+        except RETRYABLE_ERRORS as e:
+            if started or attempt >= GEMINI_MAX_RETRIES:
+                print("🔥 GEMINI ERROR:", e)
+                yield f"Gemini API error: {e}"
+                return
+            delay = _backoff(attempt)
+            print(f"⚠️ Gemini stream failed ({e!r}), retrying in {delay:.2f}s")
+            await asyncio.sleep(delay)
+        except Exception as e:
+            print("🔥 GEMINI ERROR:", e)
+            yield f"Gemini API error: {e}"
+            return
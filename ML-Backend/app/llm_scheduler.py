@@ -0,0 +1,130 @@
+# app/llm_scheduler.py
+"""
+Admission control for outbound Gemini calls.
+
+A token bucket (GEMINI_RPM, GEMINI_BURST) paces calls to the quota. When no
+token is free, callers wait in a bounded priority queue (GEMINI_QUEUE_MAX):
+syllabus chat is served before general chat, which is served before batch
+jobs. A full queue raises QueueFull, which the API turns into a 429 with
+Retry-After.
+"""
+
+import os
+import math
+import time
+import heapq
+import asyncio
+import itertools
+from collections import deque
+from typing import Any, Dict, List, Optional
+
+PRIORITIES = {"syllabus": 0, "general": 1, "batch": 2}
+
+
+class QueueFull(Exception):
+    def __init__(self, retry_after: float):
+        super().__init__(f"Gemini queue is full, retry after {retry_after:.0f}s")
+        self.retry_after = retry_after
+
+
+class GeminiScheduler:
+    def __init__(self, rate_per_sec: float, burst: int, max_queue: int):
+        self.rate = rate_per_sec
+        self.burst = burst
+        self.max_queue = max_queue
+        self._tokens = float(burst)
+        self._last = time.monotonic()
+        self._heap: List[tuple] = []
+        self._seq = itertools.count()
+        self._dispatcher: Optional[asyncio.Task] = None
+        self._waits = deque(maxlen=1000)
+        self.admitted = 0
+        self.rejected = 0
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.burst, self._tokens + (now - self._last) * self.rate)
+        self._last = now
+
+    def _waiting(self) -> List[tuple]:
+        return [item for item in self._heap if not item[2].done()]
+
+    def _retry_after(self, ahead: int) -> float:
+        return max(1.0, math.ceil((ahead + 1 - self._tokens) / self.rate))
+
+    def check_admission(self, priority: str = "general"):
+        """Raise QueueFull now if a call at this priority would be rejected."""
+        self._refill()
+        waiting = len(self._waiting())
+        if waiting >= self.max_queue:
+            self.rejected += 1
+            raise QueueFull(self._retry_after(waiting))
+
+    async def acquire(self, priority: str = "general"):
+        self._refill()
+        waiting = self._waiting()
+        if not waiting and self._tokens >= 1:
+            self._tokens -= 1
+            self.admitted += 1
+            self._waits.append(0.0)
+            return
+        if len(waiting) >= self.max_queue:
+            self.rejected += 1
+            raise QueueFull(self._retry_after(len(waiting)))
+
+        fut = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._heap, (PRIORITIES.get(priority, 1), next(self._seq), fut, priority))
+        if self._dispatcher is None or self._dispatcher.done():
+            self._dispatcher = asyncio.ensure_future(self._dispatch())
+
+        started = time.monotonic()
+        await fut
+        self.admitted += 1
+        self._waits.append(time.monotonic() - started)
+
+    async def _dispatch(self):
+        while self._heap:
+            self._refill()
+            if self._tokens >= 1:
+                _, _, fut, _ = heapq.heappop(self._heap)
+                if fut.done():
+                    # waiter was cancelled (client went away)
+                    continue
+                self._tokens -= 1
+                fut.set_result(None)
+            else:
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+    def stats(self) -> Dict[str, Any]:
+        self._refill()
+        waiting = self._waiting()
+        by_priority = {name: 0 for name in PRIORITIES}
+        for item in waiting:
+            by_priority[item[3]] = by_priority.get(item[3], 0) + 1
+        waits = sorted(self._waits)
+
+        def pct(p):
+            return round(waits[min(len(waits) - 1, int(p * len(waits)))], 3) if waits else 0.0
+
+        return {
+            "rate_per_sec": self.rate,
+            "burst": self.burst,
+            "tokens": round(self._tokens, 2),
+            "queue_depth": len(waiting),
+            "queue_depth_by_priority": by_priority,
+            "max_queue": self.max_queue,
+            "admitted": self.admitted,
+            "rejected": self.rejected,
+            "wait_seconds": {
+                "p50": pct(0.50),
+                "p95": pct(0.95),
+                "max": round(waits[-1], 3) if waits else 0.0,
+            },
+        }
+
+
+scheduler = GeminiScheduler(
+    rate_per_sec=float(os.getenv("GEMINI_RPM", "60")) / 60.0,
+    burst=int(os.getenv("GEMINI_BURST", "10")),
+    max_queue=int(os.getenv("GEMINI_QUEUE_MAX", "100")),
+)
@@ -0,0 +1,253 @@
+# app/loadtest.py
+"""
+Load driver for the chat and OCR endpoints.
+
+    python -m app.loadtest --requests 200 --concurrency 20
+    python -m app.loadtest --url http://127.0.0.1:8000 --mix mix.json
+
+Without --url the app runs in-process against a temporary copy of the
+syllabus DB with the offline fake Gemini model (GEMINI_FAKE), so no quota is
+used and results are repeatable for a given --seed. Against a running server,
+start it with GEMINI_FAKE=1 to get the same stub. The in-process transport
+buffers response bodies, so time-to-first-token is only meaningful with --url.
+
+An upload answered with 202 and a job is polled until the job finishes;
+its latency is end to end and a failed job counts as an error.
+
+A mix file is a JSON list of entries like
+    {"name": "chat", "weight": 5, "path": "/chat/gemini",
+     "form": {"query": "units in module 3"}, "stream": false,
+     "file": "path/to/upload.pdf", "poll_interval": 0.2, "job_timeout": 300}
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import asyncio
+import argparse
+import tempfile
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+import httpx
+
+ROOT_DIR = Path(__file__).resolve().parent.parent
+
+QUESTIONS = [
+    "What are the textbooks for DC?",
+    "List the units in module 3 of DC",
+    "Explain clock synchronization",
+    "What is covered in Theory of Computation?",
+    "Which module covers Turing machines?",
+    "What are the reference books for AISC?",
+    "Explain message passing in distributed systems",
+    "What topics are in the self study module?",
+]
+
+
+def default_mix() -> List[Dict[str, Any]]:
+    mix = [
+        {"name": "chat_gemini", "weight": 6, "path": "/chat/gemini", "queries": QUESTIONS},
+        {"name": "chat_gemini_stream", "weight": 3, "path": "/chat/gemini/stream",
+         "queries": QUESTIONS, "stream": True},
+        {"name": "chat_stream", "weight": 2, "path": "/chat/stream",
+         "queries": QUESTIONS, "stream": True},
+        {"name": "health", "weight": 1, "method": "GET", "path": "/health"},
+    ]
+    uploads = sorted((ROOT_DIR / "app" / "data" / "syllabus" / "uploads").glob("*.pdf"))
+    if uploads:
+        mix.append({"name": "ocr_syllabus", "weight": 1, "path": "/ocr/syllabus",
+                    "form": {"subject_name": "Load Test"}, "file": str(uploads[0])})
+    return mix
+
+
+def percentile(values: List[float], p: float) -> Optional[float]:
+    if not values:
+        return None
+    values = sorted(values)
+    idx = min(len(values) - 1, max(0, int(round(p / 100.0 * len(values))) - 1))
+    return values[idx]
+
+
+class Stats:
+    def __init__(self):
+        self.latencies: List[float] = []
+        self.ttft: List[float] = []
+        self.errors = 0
+        self.status: Dict[int, int] = {}
+
+    def report(self, elapsed: float) -> Dict[str, Any]:
+        n = len(self.latencies)
+
+        def ms(v):
+            return round(v * 1000, 1) if v is not None else None
+
+        out = {
+            "requests": n,
+            "errors": self.errors,
+            "error_rate": round(self.errors / n, 4) if n else 0.0,
+            "throughput_rps": round(n / elapsed, 2) if elapsed else 0.0,
+            "latency_ms": {p: ms(percentile(self.latencies, q))
+                           for p, q in (("p50", 50), ("p95", 95), ("p99", 99))},
+            "status": self.status,
+        }
+        if self.ttft:
+            out["ttft_ms"] = {p: ms(percentile(self.ttft, q))
+                              for p, q in (("p50", 50), ("p95", 95), ("p99", 99))}
+        return out
+
+
+async def wait_for_job(client: httpx.AsyncClient, res: httpx.Response, entry: Dict[str, Any]) -> bool:
+    """Poll a queued job (202 + status_url) until it is done or failed."""
+    body = res.json()
+    url = body.get("status_url") or f"/ocr/jobs/{body['job_id']}"
+    deadline = time.perf_counter() + entry.get("job_timeout", 300)
+    while time.perf_counter() < deadline:
+        await asyncio.sleep(entry.get("poll_interval", 0.2))
+        job = await client.get(url)
+        if job.status_code >= 400:
+            return False
+        status = job.json().get("status")
+        if status not in ("queued", "running"):
+            return status == "done"
+    return False
+
+
+async def run_one(client: httpx.AsyncClient, entry: Dict[str, Any], rng: random.Random, stats: Stats):
+    method = entry.get("method", "POST")
+    form = dict(entry.get("form", {}))
+    if entry.get("queries"):
+        form["query"] = rng.choice(entry["queries"])
+    files = None
+    if entry.get("file"):
+        p = Path(entry["file"])
+        files = {"file": (p.name, p.read_bytes())}
+
+    start = time.perf_counter()
+    ok = False
+    try:
+        if entry.get("stream"):
+            async with client.stream(method, entry["path"], data=form) as res:
+                first = None
+                async for chunk in res.aiter_text():
+                    if first is None and chunk.startswith("data:"):
+                        first = time.perf_counter() - start
+                        stats.ttft.append(first)
+                stats.status[res.status_code] = stats.status.get(res.status_code, 0) + 1
+                ok = res.status_code < 400
+        else:
+            res = await client.request(method, entry["path"], data=form or None, files=files)
+            stats.status[res.status_code] = stats.status.get(res.status_code, 0) + 1
+            ok = res.status_code < 400
+            if res.status_code == 202:
+                ok = await wait_for_job(client, res, entry)
+    except Exception:
+        stats.status[-1] = stats.status.get(-1, 0) + 1
+    stats.latencies.append(time.perf_counter() - start)
+    if not ok:
+        stats.errors += 1
+
+
+async def drive(client: httpx.AsyncClient, mix: List[Dict[str, Any]], requests: int,
+                concurrency: int, seed: int) -> Dict[str, Any]:
+    rng = random.Random(seed)
+    plan = rng.choices(mix, weights=[e.get("weight", 1) for e in mix], k=requests)
+    per_entry = {e["name"]: Stats() for e in mix}
+    total = Stats()
+    queue: asyncio.Queue = asyncio.Queue()
+    for entry in plan:
+        queue.put_nowait(entry)
+
+    async def worker(wid: int):
+        wrng = random.Random(seed * 1000 + wid)
+        while not queue.empty():
+            entry = queue.get_nowait()
+            await run_one(client, entry, wrng, per_entry[entry["name"]])
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker(i) for i in range(concurrency)))
+    elapsed = time.perf_counter() - start
+
+    total.latencies = [t for s in per_entry.values() for t in s.latencies]
+    total.errors = sum(s.errors for s in per_entry.values())
+    total.ttft = [t for s in per_entry.values() for t in s.ttft]
+    for s in per_entry.values():
+        for code, n in s.status.items():
+            total.status[code] = total.status.get(code, 0) + n
+
+    return {
+        "elapsed_s": round(elapsed, 3),
+        "concurrency": concurrency,
+        "overall": total.report(elapsed),
+        "endpoints": {name: s.report(elapsed) for name, s in per_entry.items() if s.latencies},
+    }
+
+
+def _in_process_app(tmpdir: str, args):
+    # Everything the app reads at import time must be configured first
+    db_copy = Path(tmpdir) / "database.sqlite3"
+    shutil.copy(ROOT_DIR / "database.sqlite3", db_copy)
+    os.environ["SYLLABUS_DB_PATH"] = str(db_copy)
+    os.environ["GEMINI_FAKE"] = "1"
+    os.environ["GEMINI_FAKE_LATENCY"] = str(args.latency)
+    os.environ["GEMINI_FAKE_TPS"] = str(args.tokens_per_sec)
+    os.environ["GEMINI_RPM"] = str(args.rpm)
+    os.environ.setdefault("GEMINI_BURST", str(max(1, int(args.rpm // 60))))
+
+    from app import main
+    main.UPLOADS_DIR = Path(tmpdir) / "uploads"
+    main.UPLOADS_DIR.mkdir(parents=True, exist_ok=True)
+    return main.app
+
+
+async def _run(args) -> Dict[str, Any]:
+    mix = json.loads(Path(args.mix).read_text()) if args.mix else default_mix()
+    timeout = httpx.Timeout(args.timeout)
+
+    if args.url:
+        async with httpx.AsyncClient(base_url=args.url, timeout=timeout) as client:
+            return await drive(client, mix, args.requests, args.concurrency, args.seed)
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        app = _in_process_app(tmpdir, args)
+        async with app.router.lifespan_context(app):
+            transport = httpx.ASGITransport(app=app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://loadtest", timeout=timeout) as client:
+                return await drive(client, mix, args.requests, args.concurrency, args.seed)
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    ap.add_argument("--url", help="Target a running server instead of the in-process app")
+    ap.add_argument("--mix", help="JSON file with the request mix")
+    ap.add_argument("--requests", type=int, default=200)
+    ap.add_argument("--concurrency", type=int, default=20)
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("--timeout", type=float, default=120.0)
+    ap.add_argument("--latency", type=float, default=0.5, help="Fake model first-token latency (s)")
+    ap.add_argument("--tokens-per-sec", type=float, default=50.0, help="Fake model token rate")
+    ap.add_argument("--rpm", type=float, default=100000.0,
+                    help="Scheduler rate limit for the in-process app (requests/minute)")
+    ap.add_argument("--json", action="store_true", help="Print the raw JSON report")
+    args = ap.parse_args(argv)
+
+    report = asyncio.run(_run(args))
+    if args.json:
+        print(json.dumps(report, indent=2))
+        return
+
+    print(f"\n{'endpoint':<22}{'reqs':>6}{'err%':>7}{'rps':>8}{'p50':>9}{'p95':>9}{'p99':>9}{'ttft50':>9}")
+    rows = list(report["endpoints"].items()) + [("overall", report["overall"])]
+    for name, r in rows:
+        lat = r["latency_ms"]
+        ttft = r.get("ttft_ms", {}).get("p50")
+        print(f"{name:<22}{r['requests']:>6}{r['error_rate'] * 100:>6.1f}%{r['throughput_rps']:>8.1f}"
+              f"{lat['p50']:>9}{lat['p95']:>9}{lat['p99']:>9}{ttft if ttft is not None else '-':>9}")
+    print(f"\nelapsed {report['elapsed_s']}s, concurrency {report['concurrency']}; latencies in ms")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,39 +1,63 @@
-from app.syllabus_context import build_context
+from app.syllabus_context import build_context, build_routed_context, build_syllabus_prompt, bump_generation, get_fingerprint
+from app.database_utils import get_structured, save_structured
+from app.syllabus_parser import PARSER_VERSION, parse_syllabus_structured
+from app.outline import extract_outline
+from app.reparse import reparse_subjects
+from app.syllabus_search import init_search_index, search_syllabus, sync_search_index
 import json
 import csv
+import asyncio
+import hashlib
 import os
 import re
 import io
 import sqlite3
 from uuid import uuid4
 from datetime import datetime
-from typing import List, Optional, Dict, Any
+from typing import BinaryIO, List, Optional, Dict, Any, Tuple
 from pathlib import Path
-from app.gemini_client import ask_gemini
-from fastapi.responses import StreamingResponse
+from app.gemini_client import ask_gemini_async, ask_gemini_stream_async, is_error_reply
+from app.llm_scheduler import QueueFull, scheduler
+from app.answer_cache import cache_from_env, make_key, normalize_query
+from app.single_flight import SingleFlight
+from app.api.schemas import BatchChatRequest, BatchChatItem, BatchChatResponse, ChatRequest, ChatResponse, ChatTurn
+from app.conversations import ConversationStore, compact, format_history, split_recent
+from app.ocr import OCR_VERSION, extract_pdf_pages, join_pages, ocr_image_file, page_sources, pool_health_loop, shutdown_pool, warm_pool
+from app.ocr_jobs import OcrJobRunner, OcrJobStore
+from app.db import close_pools, pool_for
+from fastapi.responses import JSONResponse, StreamingResponse
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi import (
     FastAPI, HTTPException, UploadFile, File, Form,
-    BackgroundTasks, APIRouter
+    BackgroundTasks, APIRouter, Request, Response
 )
 from dotenv import load_dotenv
 load_dotenv()
 
 
-# Optional OCR deps (don’t block CSV upload if missing)
-try:
-    import pytesseract  # type: ignore
-    from PIL import Image  # type: ignore
-except Exception:
-    pytesseract = None  # type: ignore
-    Image = None  # type: ignore
+app = FastAPI(title="Syllabus OCR + Chatbot API")
 
-try:
-    import fitz  # PyMuPDF  # type: ignore
-except Exception:
-    fitz = None  # type: ignore
 
-app = FastAPI(title="Syllabus OCR + Chatbot API")
+@app.exception_handler(QueueFull)
+async def gemini_queue_full(request, exc: QueueFull):
+    return JSONResponse(
+        status_code=429,
+        content={"success": False, "detail": str(exc)},
+        headers={"Retry-After": str(int(exc.retry_after))},
+    )
+
+@app.middleware("http")
+async def limit_upload_size(request, call_next):
+    # Reject oversized bodies from Content-Length before the multipart parser
+    # spools them; chunked uploads are caught while copying (store_upload).
+    length = request.headers.get("content-length")
+    if length and length.isdigit() and int(length) > UPLOAD_MAX_BYTES + UPLOAD_CHUNK_BYTES:
+        return JSONResponse(
+            status_code=413,
+            content={"detail": UPLOAD_TOO_LARGE},
+        )
+    return await call_next(request)
 
 # -------------------- CORS --------------------
 app.add_middleware(
@@ -53,7 +77,9 @@ app.add_middleware(
 ROOT_DIR = Path(__file__).resolve().parent.parent
 
 # Single consistent DB file (never duplicated again)
-DB_PATH = ROOT_DIR / "database.sqlite3"
+DB_PATH = Path(os.getenv("SYLLABUS_DB_PATH") or ROOT_DIR / "database.sqlite3")
+# Pooled WAL connections shared by every helper below (see app/db.py)
+db = pool_for(DB_PATH)
 
 # Keep syllabus data in app/data/syllabus
 DATA_DIR = Path(__file__).resolve().parent / "data" / "syllabus"
@@ -63,44 +89,21 @@ UPLOADS_DIR = DATA_DIR / "uploads"
 DATA_DIR.mkdir(parents=True, exist_ok=True)
 UPLOADS_DIR.mkdir(parents=True, exist_ok=True)
 
+# Largest accepted upload (syllabus scans, CSVs); larger requests get 413
+UPLOAD_MAX_BYTES = int(os.getenv("UPLOAD_MAX_BYTES", str(25 * 1024 * 1024)))
+UPLOAD_CHUNK_BYTES = 1024 * 1024
+UPLOAD_TOO_LARGE = f"File too large. Maximum upload size is {UPLOAD_MAX_BYTES // (1024 * 1024)} MB."
+
 print("📌 DB PATH:", DB_PATH)
 print("📌 DATA DIR:", DATA_DIR)
 print("📌 UPLOADS DIR:", UPLOADS_DIR)
 
 
-# -------------------- Tesseract configuration --------------------
-
-
-def setup_tesseract_cmd():
-    if pytesseract is None:
-        print("ℹ️ pytesseract not installed. OCR endpoints will be limited.")
-        return
-
-    env_path = os.getenv("TESSERACT_CMD")
-    if env_path and Path(env_path).exists():
-        pytesseract.pytesseract.tesseract_cmd = env_path
-        return
-
-    win_path = r"C:\Program Files\Tesseract-OCR\tesseract.exe"
-    if Path(win_path).exists():
-        pytesseract.pytesseract.tesseract_cmd = win_path
-        return
-
-    for p in ["/usr/bin/tesseract", "/usr/local/bin/tesseract", "/opt/homebrew/bin/tesseract"]:
-        if Path(p).exists():
-            pytesseract.pytesseract.tesseract_cmd = p
-            return
-
-    print("⚠️ Tesseract path not explicitly set. Ensure tesseract is in PATH or set TESSERACT_CMD env var.")
-
-
-setup_tesseract_cmd()
-
 # -------------------- DB helpers --------------------
 
 
 def init_db():
-    with sqlite3.connect(DB_PATH) as con:
+    with db.connection() as con:
         con.execute(
             """
             CREATE TABLE IF NOT EXISTS syllabus (
@@ -110,7 +113,11 @@ def init_db():
                 created_at TEXT NOT NULL,
                 file_name TEXT,
                 file_path TEXT,
-                outline_json TEXT
+                outline_json TEXT,
+                structured_json TEXT,
+                parser_version INTEGER,
+                page_sources_json TEXT,
+                row_version INTEGER NOT NULL DEFAULT 1
             );
             """
         )
@@ -120,22 +127,78 @@ def init_db():
             if "outline_json" not in cols:
                 con.execute(
                     "ALTER TABLE syllabus ADD COLUMN outline_json TEXT")
+            if "structured_json" not in cols:
+                con.execute(
+                    "ALTER TABLE syllabus ADD COLUMN structured_json TEXT")
+            if "parser_version" not in cols:
+                con.execute(
+                    "ALTER TABLE syllabus ADD COLUMN parser_version INTEGER")
+            if "page_sources_json" not in cols:
+                con.execute(
+                    "ALTER TABLE syllabus ADD COLUMN page_sources_json TEXT")
+            if "row_version" not in cols:
+                con.execute(
+                    "ALTER TABLE syllabus ADD COLUMN row_version INTEGER NOT NULL DEFAULT 1")
         except Exception:
             pass
+        # Every content change bumps row_version, whichever helper (or the
+        # bulk reparse) wrote it; ETags are derived from it.
+        con.execute(
+            """
+            CREATE TRIGGER IF NOT EXISTS syllabus_row_version
+            AFTER UPDATE OF name, text, file_name, file_path, outline_json, structured_json,
+                            parser_version, page_sources_json ON syllabus
+            BEGIN
+                UPDATE syllabus SET row_version = row_version + 1 WHERE id = NEW.id;
+            END;
+            """
+        )
+        init_search_index(con)
         con.commit()
 
 
-def save_subject(name: str, text: str, file_name: Optional[str], file_bytes: Optional[bytes]) -> str:
+def store_upload(file_name: str, src: BinaryIO) -> Tuple[str, Path]:
+    """
+    Copy an upload into content-addressed storage in chunks (byte-identical
+    uploads share one file named by sha256), enforcing UPLOAD_MAX_BYTES as
+    it goes. Never holds the whole file in memory.
+    """
+    digest = hashlib.sha256()
+    size = 0
+    tmp = UPLOADS_DIR / f".{uuid4().hex}.part"
+    try:
+        with open(tmp, "wb") as out:
+            while True:
+                chunk = src.read(UPLOAD_CHUNK_BYTES)
+                if not chunk:
+                    break
+                size += len(chunk)
+                if size > UPLOAD_MAX_BYTES:
+                    raise HTTPException(
+                        status_code=413, detail=UPLOAD_TOO_LARGE)
+                digest.update(chunk)
+                out.write(chunk)
+        if size == 0:
+            raise HTTPException(
+                status_code=400, detail="Uploaded file is empty.")
+
+        path = UPLOADS_DIR / f"{digest.hexdigest()}{Path(file_name).suffix.lower()}"
+        if not path.exists():
+            os.replace(tmp, path)
+        return digest.hexdigest(), path
+    finally:
+        tmp.unlink(missing_ok=True)
+
+
+def save_subject(name: str, text: str, file_name: Optional[str], file_bytes: Optional[bytes],
+                 saved_path: Optional[Path] = None) -> str:
     sid = str(uuid4())
     created_at = datetime.utcnow().isoformat()
 
-    saved_path = None
-    if file_name and file_bytes:
-        ext = Path(file_name).suffix
-        saved_path = UPLOADS_DIR / f"{sid}{ext}"
-        saved_path.write_bytes(file_bytes)
+    if saved_path is None and file_name and file_bytes:
+        _, saved_path = store_upload(file_name, io.BytesIO(file_bytes))
 
-    with sqlite3.connect(DB_PATH) as con:
+    with db.connection() as con:
         con.execute(
             "INSERT INTO syllabus (id, name, text, created_at, file_name, file_path, outline_json) VALUES (?, ?, ?, ?, ?, ?, ?)",
             (sid, name, text, created_at, file_name or None,
@@ -147,7 +210,7 @@ def save_subject(name: str, text: str, file_name: Optional[str], file_bytes: Opt
 
 
 def update_outline(subject_id: str, outline: Dict[str, Any]):
-    with sqlite3.connect(DB_PATH) as con:
+    with db.connection() as con:
         con.execute(
             "UPDATE syllabus SET outline_json = ? WHERE id = ?",
             (json.dumps(outline, ensure_ascii=False), subject_id),
@@ -155,8 +218,17 @@ def update_outline(subject_id: str, outline: Dict[str, Any]):
         con.commit()
 
 
+def update_page_sources(subject_id: str, sources: List[Dict[str, Any]]):
+    with db.connection() as con:
+        con.execute(
+            "UPDATE syllabus SET page_sources_json = ? WHERE id = ?",
+            (json.dumps(sources), subject_id),
+        )
+        con.commit()
+
+
 def list_subjects():
-    with sqlite3.connect(DB_PATH) as con:
+    with db.connection() as con:
         con.row_factory = sqlite3.Row
         rows = con.execute(
             "SELECT id, name, created_at FROM syllabus ORDER BY created_at DESC").fetchall()
@@ -164,29 +236,42 @@ def list_subjects():
 
 
 def get_subject(subject_id: str):
-    with sqlite3.connect(DB_PATH) as con:
+    with db.connection() as con:
         con.row_factory = sqlite3.Row
         row = con.execute(
-            "SELECT id, name, text, created_at, outline_json FROM syllabus WHERE id = ?",
+            "SELECT id, name, text, created_at, outline_json, structured_json, parser_version, page_sources_json FROM syllabus WHERE id = ?",
             (subject_id,)
         ).fetchone()
         return dict(row) if row else None
 
 
 def get_subject_by_name(subject_name: str):
-    with sqlite3.connect(DB_PATH) as con:
+    with db.connection() as con:
         con.row_factory = sqlite3.Row
         row = con.execute(
-            "SELECT id, name, text, created_at, outline_json FROM syllabus WHERE LOWER(name) = LOWER(?)",
+            "SELECT id, name, text, created_at, outline_json, structured_json, parser_version FROM syllabus WHERE LOWER(name) = LOWER(?)",
             (subject_name.strip(),)
         ).fetchone()
         return dict(row) if row else None
 
 
-def get_all_syllabus_data() -> List[Dict[str, str]]:
-    with sqlite3.connect(DB_PATH) as con:
+def get_subject_version(subject_id: Optional[str] = None, subject_name: Optional[str] = None):
+    """id, row_version and parse state of a subject, without reading its text."""
+    where, arg = ("id = ?", subject_id) if subject_id else ("LOWER(name) = LOWER(?)", (subject_name or "").strip())
+    with db.connection() as con:
+        con.row_factory = sqlite3.Row
+        row = con.execute(
+            f"SELECT id, row_version, parser_version, structured_json IS NOT NULL AS parsed FROM syllabus WHERE {where}",
+            (arg,)
+        ).fetchone()
+        return dict(row) if row else None
+
+
+def get_all_syllabus_data() -> List[Dict[str, Any]]:
+    with db.connection() as con:
         con.row_factory = sqlite3.Row
-        rows = con.execute("SELECT name, text FROM syllabus").fetchall()
+        rows = con.execute(
+            "SELECT id, name, text, structured_json, parser_version FROM syllabus").fetchall()
         return [dict(r) for r in rows]
 
 # -------------------- RAG Indexing (Background) --------------------
@@ -209,59 +294,22 @@ def run_rag_rebuild():
         print(f"❌ Error during RAG index rebuild: {e}")
 
 
-def rebuild_index_background(background_tasks: BackgroundTasks):
-    print("Queueing RAG index rebuild in background...")
-    background_tasks.add_task(run_rag_rebuild)
-
-# -------------------- OCR helpers --------------------
-
-
-def clean_text(text: str) -> str:
-    text = re.sub(r"\r\n", "\n", text)
-    text = re.sub(r"[ \t]+", " ", text)
-    text = re.sub(r"\n{3,}", "\n\n", text).strip()
-    return text
-
-
-def ocr_image_bytes(img_bytes: bytes) -> str:
-    if pytesseract is None or Image is None:
-        raise HTTPException(
-            status_code=503, detail="OCR dependencies not installed on server.")
-    img = Image.open(io.BytesIO(img_bytes)).convert("RGB")
-    out = pytesseract.image_to_string(img, lang="eng")
-    return clean_text(out)
-
-
-def pdf_to_images_bytes(pdf_bytes: bytes, zoom: float = 2.0) -> List[bytes]:
-    if fitz is None:
-        raise HTTPException(
-            status_code=503, detail="PDF OCR dependencies not installed on server.")
-    images = []
-    with fitz.open(stream=pdf_bytes, filetype="pdf") as doc:
-        mat = fitz.Matrix(zoom, zoom)
-        for page in doc:
-            pix = page.get_pixmap(matrix=mat, alpha=False)
-            images.append(pix.tobytes("png"))
-    return images
-
-
-def ocr_pdf_bytes(pdf_bytes: bytes) -> str:
-    if fitz is None:
-        raise HTTPException(
-            status_code=503, detail="PDF OCR dependencies not installed on server.")
+def run_rag_upsert(subject_id: str):
+    """Embed only one subject's chunks, replacing its previous ones."""
     try:
-        with fitz.open(stream=pdf_bytes, filetype="pdf") as doc:
-            extracted = "\n".join(page.get_text("text") for page in doc)
-            if len(extracted.strip()) > 500:
-                return clean_text(extracted)
-    except Exception:
-        pass
+        row = get_subject(subject_id)
+        from app import chatbot as cb
+        if not row:
+            cb.remove_subject(subject_id)
+            return
+        n = cb.upsert_subject(row)
+        print(f"✅ RAG index updated for {row['name']}: {n} chunks.")
+    except Exception as e:
+        print(f"❌ RAG update skipped for {subject_id}: {e}")
 
-    text_chunks = []
-    page_images = pdf_to_images_bytes(pdf_bytes, zoom=2.0)
-    for ib in page_images:
-        text_chunks.append(ocr_image_bytes(ib))
-    return clean_text("\n\n".join(text_chunks))
+
+def index_subject_background(background_tasks: BackgroundTasks, subject_id: str):
+    background_tasks.add_task(run_rag_upsert, subject_id)
 
 # -------------------- CSV helpers for prediction --------------------
 
@@ -417,102 +465,85 @@ def compute_risk(row: Dict[str, Any]) -> float:
     return round(risk, 1)
 
 
-# -------------------- Chapter/Topic extraction --------------------
-chapter_header = re.compile(
-    r"^\s*(?:chapter|unit|module|part|section)\s*(\d+)?\s*[:.)-]*\s*(.+)$",
-    flags=re.I
-)
-week_header = re.compile(
-    r"^\s*week\s*(\d+)\s*[:.)-]*\s*(.+)?$",
-    flags=re.I
-)
-topic_line = re.compile(
-    r"^\s*(?:[-•*]+|\d+\)|\d+\.\s+|[a-zA-Z]\))\s*(.+?)\s*$"
-)
+# -------------------- Chatbot Router (lazy import) --------------------
 
+# Syllabus chat answers, keyed by normalised query + syllabus fingerprint
+answer_cache = cache_from_env(DB_PATH)
 
-def extract_outline(text: str) -> Dict[str, Any]:
-    lines = [ln.strip() for ln in text.splitlines() if ln.strip()]
-    chapters: List[Dict[str, Any]] = []
-    current = None
-
-    for ln in lines:
-        m1 = chapter_header.match(ln)
-        m2 = week_header.match(ln)
-
-        if m1:
-            num, title = m1.group(1), m1.group(2) or ""
-            title = title.strip()
-            label = f"Chapter {num}: {title}" if num else f"Chapter: {title}"
-            current = {"title": label, "topics": []}
-            chapters.append(current)
-            continue
-
-        if m2:
-            num, title = m2.group(1), (m2.group(2) or "").strip()
-            label = f"Week {num}" + (f": {title}" if title else "")
-            current = {"title": label, "topics": []}
-            chapters.append(current)
-            continue
-
-        mt = topic_line.match(ln)
-        if mt and current:
-            topic = mt.group(1).strip()
-            if topic and len(topic) > 2:
-                current["topics"].append(topic)
-            continue
-
-        if current and 3 <= len(ln) <= 120 and not ln.lower().startswith(("chapter", "unit", "module", "part", "section", "week")):
-            if not re.search(r"(syllabus|objective|outcome|policy|grading|assessment)", ln, re.I):
-                current["topics"].append(ln)
-
-    if not chapters:
-        topics = []
-        for ln in lines:
-            mt = topic_line.match(ln)
-            if mt:
-                topics.append(mt.group(1).strip())
-        if topics:
-            chapters = [{"title": "Syllabus", "topics": topics}]
-
-    chapters = [c for c in chapters if c.get(
-        "title") and isinstance(c.get("topics"), list)]
-    return {"chapters": chapters}
+# Identical syllabus questions arriving together share one Gemini call
+chat_flights = SingleFlight()
 
-# -------------------- Chatbot Router (lazy import) --------------------
+# Multi-turn syllabus chat state, keyed by conversation id
+conversations = ConversationStore(DB_PATH)
 
 
-# harshit chatgpt code
-@app.post("/chat/gemini")
-async def gemini_chat_smart(query: str = Form(...)):
-    if not query.strip():
-        raise HTTPException(status_code=400, detail="Query cannot be empty.")
+def syllabus_answer_key(query: str, k: int) -> str:
+    return make_key("syllabus", normalize_query(query), k, get_fingerprint())
 
-    print(f"📩 Smart Query: {query}")
 
-    # Build dynamic syllabus context
-    context = build_context()
+def batch_answer_key(query: str) -> str:
+    # Batch answers see the whole syllabus, not the RAG top-k, so they are
+    # cached apart from /chat/gemini answers to the same question
+    return make_key("batch", normalize_query(query), get_fingerprint())
+
+
+async def cache_answer_stream(key: str, tokens):
+    parts = []
+    async for token in tokens:
+        parts.append(token)
+        yield token
+    reply = "".join(parts)
+    if reply and not is_error_reply(reply):
+        await run_in_threadpool(answer_cache.put, key, reply)
+
+
+async def single_token(text: str):
+    yield text
+
+
+def syllabus_chat_prompt(query: str, k: int, history: str = "", search_query: Optional[str] = None) -> str:
+    search_query = search_query or query
+    # Top-k syllabus chunks from the RAG index; if it isn't built, the
+    # subjects that best match the query
+    context = None
+    try:
+        from app import chatbot as cb
+        context = cb.retrieve_context(search_query, k)
+    except Exception as e:
+        print(f"ℹ️ RAG retrieval unavailable, routing by subject: {e}")
+    if not context:
+        context = build_routed_context(search_query)
 
     # Construct final prompt for Gemini
-    prompt = f"""
-You are an academic assistant for students.
+    return build_syllabus_prompt(context, query, history)
+
 
-Here is the entire syllabus data of the system. Use it to answer:
+async def answer_syllabus_query(key: str, query: str, k: int) -> str:
+    # Re-check: an identical flight may have finished just before this one.
+    # The caller already counted this request's miss.
+    reply = await run_in_threadpool(answer_cache.peek, key)
+    if reply is not None:
+        return reply
+    prompt = await run_in_threadpool(syllabus_chat_prompt, query, k)
+    reply = await ask_gemini_async(prompt, priority="syllabus")
+    if not is_error_reply(reply):
+        await run_in_threadpool(answer_cache.put, key, reply)
+    return reply
 
--------------------
-CONTEXT START
-{context}
--------------------
-CONTEXT END
 
-User question: {query}
+async def stream_syllabus_answer(key: str, query: str, k: int):
+    prompt = await run_in_threadpool(syllabus_chat_prompt, query, k)
+    async for token in cache_answer_stream(key, ask_gemini_stream_async(prompt, priority="syllabus")):
+        yield token
 
-Rules:
-- Give answers ONLY using the syllabus context.
-- If the question is about modules/units/books, extract correct info.
-- If not found, say 'This topic is not in the syllabus.'
-- if the the response is in bullet points, maintain the bullet points in your response also separate with <br />.
 
+def general_chat_prompt(query: str) -> str:
+    # Force README.md formatting
+    return f"""
+You are an AI assistant. Answer the following query strictly in clean GitHub README.md markdown.
+
+User Query:
+{query}
 
 ### Response Format Rules (IMPORTANT)
 - Use clean GitHub-flavored Markdown (GFM).
@@ -525,10 +556,39 @@ Rules:
 - You may use emojis to make the answer engaging but do NOT overuse them.
 - NEVER add backslashes or escape characters unnecessarily.
 - The final output must look like a clean README.md section.
+
+Now generate the answer based on these rules.
 """
-    # prompt = query
-    # print("promt", prompt)
-    reply = ask_gemini(prompt)
+
+
+def sse_event(data: str) -> str:
+    # Multi-line payloads need one "data:" field per line
+    return "".join(f"data: {line}\n" for line in data.split("\n")) + "\n"
+
+
+async def sse_stream(tokens):
+    try:
+        async for token in tokens:
+            yield sse_event(token)
+    except Exception as e:
+        yield sse_event(f"[ERROR] {str(e)}")
+    finally:
+        yield "event: done\ndata: [END]\n\n"
+
+
+# harshit chatgpt code
+@app.post("/chat/gemini")
+async def gemini_chat_smart(query: str = Form(...), k: int = Form(4)):
+    if not query.strip():
+        raise HTTPException(status_code=400, detail="Query cannot be empty.")
+
+    print(f"📩 Smart Query: {query}")
+
+    key = await run_in_threadpool(syllabus_answer_key, query, k)
+    reply = await run_in_threadpool(answer_cache.get, key)
+    if reply is None:
+        reply = await chat_flights.do(
+            key, lambda: answer_syllabus_query(key, query, k))
 
     return {
         "success": True,
@@ -536,37 +596,38 @@ Rules:
     }
 
 
-# route for general chat with gemini
-@app.post("/general-chat/gemini")
-async def gemini_chat_smart(query: str = Form(...)):
+@app.post("/chat/gemini/stream")
+async def gemini_chat_smart_stream(query: str = Form(...), k: int = Form(4)):
     if not query.strip():
         raise HTTPException(status_code=400, detail="Query cannot be empty.")
 
-    print(f"📩 Smart Query: {query}")
+    print(f"📩 Smart Query (stream): {query}")
 
-    # Force README.md formatting
-    query = f"""
-You are an AI assistant. Answer the following query strictly in clean GitHub README.md markdown.
+    key = await run_in_threadpool(syllabus_answer_key, query, k)
+    cached = await run_in_threadpool(answer_cache.get, key)
+    if cached is not None:
+        return StreamingResponse(sse_stream(single_token(cached)), media_type="text/event-stream")
 
-User Query:
-{query}
+    # Reject with 429 before the stream starts rather than mid-response
+    scheduler.check_admission("syllabus")
 
-### Response Format Rules (IMPORTANT)
-- Use clean GitHub-flavored Markdown (GFM).
-- Use headings (##, ###) only when needed.
-- If listing items, use proper markdown bullet points: `-` or `*`
-- Keep paragraphs short (1–3 lines each).
-- Keep bold text as **bold**.
-- Do NOT use <br />, or HTML tags.
-- Use code blocks only when necessary.
-- You may use emojis to make the answer engaging but do NOT overuse them.
-- NEVER add backslashes or escape characters unnecessarily.
-- The final output must look like a clean README.md section.
+    tokens = chat_flights.stream(
+        "stream:" + key, lambda: stream_syllabus_answer(key, query, k))
+    return StreamingResponse(sse_stream(tokens), media_type="text/event-stream")
 
-Now generate the answer based on these rules.
-"""
 
-    reply = ask_gemini(query)
+# route for general chat with gemini
+@app.post("/general-chat/gemini")
+async def gemini_chat_smart(query: str = Form(...)):
+    if not query.strip():
+        raise HTTPException(status_code=400, detail="Query cannot be empty.")
+
+    print(f"📩 Smart Query: {query}")
+
+    reply = await ask_gemini_async(general_chat_prompt(query), priority="general")
+    if is_error_reply(reply):
+        # Let callers (the Node proxy) see the failure instead of a 200 "answer"
+        raise HTTPException(status_code=502, detail=reply)
 
     return {
         "success": True,
@@ -574,6 +635,19 @@ Now generate the answer based on these rules.
     }
 
 
+@app.post("/general-chat/gemini/stream")
+async def gemini_general_chat_stream(query: str = Form(...)):
+    if not query.strip():
+        raise HTTPException(status_code=400, detail="Query cannot be empty.")
+
+    print(f"📩 Smart Query (stream): {query}")
+
+    scheduler.check_admission("general")
+    prompt = general_chat_prompt(query)
+    tokens = ask_gemini_stream_async(prompt, priority="general")
+    return StreamingResponse(sse_stream(tokens), media_type="text/event-stream")
+
+
 chat_router = APIRouter(prefix="/chat", tags=["Chatbot"])
 
 
@@ -581,7 +655,8 @@ chat_router = APIRouter(prefix="/chat", tags=["Chatbot"])
 @chat_router.post("")
 async def handle_chat_query(
     query: str = Form(...),
-    use_rag: bool = Form(True)
+    use_rag: bool = Form(True),
+    k: int = Form(4)
 ):
     print(f"📩 Received chat query: '{query}' | use_rag={use_rag}")
     if not query or not query.strip():
@@ -592,10 +667,10 @@ async def handle_chat_query(
         except Exception as e:
             raise HTTPException(
                 status_code=503, detail=f"Chatbot unavailable: {e}")
-        response = cb.process_user_query(query.strip(), use_rag)
+        response = await cb.process_user_query(query.strip(), use_rag, k=k)
         print(f"✅ Response generated: {response[:120]}...")
         return {"response": response, "success": True}
-    except HTTPException:
+    except (HTTPException, QueueFull):
         raise
     except Exception as e:
         print(f"❌ Chat processing error: {e}")
@@ -606,22 +681,106 @@ async def handle_chat_query(
 @chat_router.post("/stream")
 async def handle_chat_stream(
     query: str = Form(...),
-    use_rag: bool = Form(True)
+    use_rag: bool = Form(True),
+    k: int = Form(4)
 ):
     if not query or not query.strip():
         raise HTTPException(status_code=400, detail="Query cannot be empty.")
 
-    def sse():
-        try:
-            from app import chatbot as cb
-            for token in cb.process_user_query_stream(query.strip(), use_rag=use_rag):
-                yield f"data: {token}\n\n"
-        except Exception as e:
-            yield f"data: [ERROR] {str(e)}\n\n"
-        finally:
-            yield "event: done\ndata: [END]\n\n"
+    async def tokens():
+        from app import chatbot as cb
+        async for token in cb.process_user_query_stream(query.strip(), use_rag=use_rag, k=k):
+            yield token
+
+    scheduler.check_admission("syllabus" if use_rag else "general")
+    return StreamingResponse(sse_stream(tokens()), media_type="text/event-stream")
 
-    return StreamingResponse(sse(), media_type="text/event-stream")
+CHAT_BATCH_MAX_ITEMS = int(os.getenv("CHAT_BATCH_MAX_ITEMS", "50"))
+CHAT_BATCH_CONCURRENCY = int(os.getenv("CHAT_BATCH_CONCURRENCY", "4"))
+CHAT_BATCH_ITEM_TIMEOUT = float(os.getenv("CHAT_BATCH_ITEM_TIMEOUT", "60"))
+
+
+@chat_router.post("/batch", response_model=BatchChatResponse)
+async def handle_chat_batch(req: BatchChatRequest):
+    """
+    Answer many syllabus questions concurrently (FAQ pre-generation, eval
+    sets). Every item is answered from the full syllabus context, built once
+    for the batch; answers are cached under their own keys.
+    """
+    queries = [q.strip() for q in req.queries]
+    if not queries or not all(queries):
+        raise HTTPException(status_code=400, detail="Queries cannot be empty.")
+    if len(queries) > CHAT_BATCH_MAX_ITEMS:
+        raise HTTPException(
+            status_code=400, detail=f"At most {CHAT_BATCH_MAX_ITEMS} queries per batch.")
+
+    concurrency = max(1, min(req.concurrency or CHAT_BATCH_CONCURRENCY, CHAT_BATCH_CONCURRENCY))
+    timeout = min(req.timeout or CHAT_BATCH_ITEM_TIMEOUT, CHAT_BATCH_ITEM_TIMEOUT)
+    print(f"📩 Batch of {len(queries)} queries | concurrency={concurrency}")
+
+    context = await run_in_threadpool(build_context)
+    sem = asyncio.Semaphore(concurrency)
+
+    async def answer(query: str) -> BatchChatItem:
+        key = await run_in_threadpool(batch_answer_key, query)
+        cached = await run_in_threadpool(answer_cache.get, key)
+        if cached is not None:
+            return BatchChatItem(query=query, response=cached, cached=True)
+        async with sem:
+            try:
+                reply = await asyncio.wait_for(
+                    ask_gemini_async(build_syllabus_prompt(context, query), priority="batch"), timeout)
+            except asyncio.TimeoutError:
+                return BatchChatItem(query=query, error=f"Timed out after {timeout:g}s")
+            except QueueFull as e:
+                return BatchChatItem(query=query, error=str(e))
+        if is_error_reply(reply):
+            return BatchChatItem(query=query, error=reply)
+        await run_in_threadpool(answer_cache.put, key, reply)
+        return BatchChatItem(query=query, response=reply)
+
+    results = await asyncio.gather(*(answer(q) for q in queries))
+    return BatchChatResponse(success=True, results=list(results))
+
+
+@chat_router.post("/conversation", response_model=ChatResponse)
+async def handle_conversation(req: ChatRequest, background_tasks: BackgroundTasks):
+    """
+    Multi-turn syllabus chat. Send only the new message plus the
+    conversation_id from the previous reply; history lives on the server.
+    """
+    message = req.message.strip()
+    if not message:
+        raise HTTPException(status_code=400, detail="Message cannot be empty.")
+
+    cid = await run_in_threadpool(conversations.ensure, req.conversation_id)
+    summary, turns = await run_in_threadpool(conversations.load, cid)
+    if not summary and not turns and req.history:
+        # Clients that still replay the transcript seed the conversation once
+        await run_in_threadpool(
+            conversations.append, cid, [(t.role, t.content) for t in req.history])
+        summary, turns = await run_in_threadpool(conversations.load, cid)
+
+    _, recent = split_recent(turns)
+    last_user = next((t["content"] for t in reversed(recent) if t["role"] == "user"), "")
+    prompt = await run_in_threadpool(
+        syllabus_chat_prompt, message, req.k,
+        format_history(summary, recent), f"{last_user} {message}".strip())
+    reply = await ask_gemini_async(prompt, priority="syllabus")
+
+    if not is_error_reply(reply):
+        await run_in_threadpool(
+            conversations.append, cid, [("user", message), ("assistant", reply)])
+        background_tasks.add_task(compact, conversations, cid)
+
+    history = [ChatTurn(role=t["role"], content=t["content"]) for t in recent]
+    history += [ChatTurn(role="user", content=message), ChatTurn(role="assistant", content=reply)]
+    return ChatResponse(reply=reply, history=history, conversation_id=cid)
+
+
+@chat_router.get("/cache/stats")
+async def chat_cache_stats():
+    return {**answer_cache.stats(), "single_flight": chat_flights.stats()}
 
 app.include_router(chat_router)
 
@@ -637,9 +796,25 @@ async def root():
 async def health():
     return {"ok": True}
 
+
+@app.get("/gemini/stats")
+async def gemini_scheduler_stats():
+    return scheduler.stats()
+
 # Accept both /uploadfile and /uploadfile/ to avoid redirect issues
 
 
+def read_csv_rows(src: BinaryIO, encoding: str) -> List[Dict[str, Any]]:
+    """Decode and parse straight from the spooled upload, skipping blank rows."""
+    text = io.TextIOWrapper(src, encoding=encoding, newline="")
+    try:
+        return [row for row in csv.DictReader(text)
+                if any((v or "").strip() for v in row.values())]
+    finally:
+        # Leave the upload's file open for a possible retry
+        text.detach()
+
+
 @app.post("/uploadfile")
 @app.post("/uploadfile/")
 async def upload_csv(file_upload: UploadFile = File(...)):
@@ -648,25 +823,26 @@ async def upload_csv(file_upload: UploadFile = File(...)):
         raise HTTPException(
             status_code=400, detail="Please upload a CSV file.")
 
-    raw = await file_upload.read()
-    if not raw:
+    src = file_upload.file
+    src.seek(0, os.SEEK_END)
+    size = src.tell()
+    src.seek(0)
+    if not size:
         raise HTTPException(status_code=400, detail="Uploaded file is empty.")
+    if size > UPLOAD_MAX_BYTES:
+        raise HTTPException(
+            status_code=413, detail=UPLOAD_TOO_LARGE)
 
     try:
-        text = raw.decode("utf-8-sig")
+        rows = await run_in_threadpool(read_csv_rows, src, "utf-8-sig")
     except UnicodeDecodeError:
         try:
-            text = raw.decode("latin-1")
+            src.seek(0)
+            rows = await run_in_threadpool(read_csv_rows, src, "latin-1")
         except Exception:
             raise HTTPException(
                 status_code=400, detail="Could not decode CSV. Use UTF-8 or UTF-8 with BOM.")
 
-    reader = csv.DictReader(io.StringIO(text))
-    rows: List[Dict[str, Any]] = []
-    for row in reader:
-        if any((v or "").strip() for v in row.values()):
-            rows.append(row)
-
     if not rows:
         return {"data": []}
 
@@ -682,12 +858,107 @@ async def upload_csv(file_upload: UploadFile = File(...)):
     return {"data": results}
 
 
-@app.post("/ocr/syllabus")
+# -------------------- HTTP caching --------------------
+
+# Clients may keep syllabus responses but must revalidate (If-None-Match)
+# once they are older than this; 0 means revalidate on every use.
+SYLLABUS_CACHE_MAX_AGE = int(os.getenv("SYLLABUS_CACHE_MAX_AGE", "0"))
+
+
+def make_etag(*parts: Any) -> str:
+    return '"' + hashlib.sha1(":".join(map(str, parts)).encode("utf-8")).hexdigest()[:24] + '"'
+
+
+def cache_headers(etag: str) -> Dict[str, str]:
+    return {"ETag": etag, "Cache-Control": f"public, max-age={SYLLABUS_CACHE_MAX_AGE}, must-revalidate"}
+
+
+def etag_matches(request: Request, etag: str) -> bool:
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    # If-None-Match uses weak comparison
+    tags = [t.strip() for t in header.split(",")]
+    return "*" in tags or etag in (t[2:] if t.startswith("W/") else t for t in tags)
+
+
+def not_modified(etag: str) -> Response:
+    return Response(status_code=304, headers=cache_headers(etag))
+
+
+def cached_json(content: Any, etag: str) -> JSONResponse:
+    return JSONResponse(content=content, headers=cache_headers(etag))
+
+
+# -------------------- Syllabus OCR jobs --------------------
+
+
+def extract_upload_text(file_name: str, file_path: Path):
+    """Returns (text, per-page sources)."""
+    if file_name.lower().endswith(".pdf"):
+        pages = extract_pdf_pages(file_path)
+        return join_pages(pages), page_sources(pages)
+    text = ocr_image_file(file_path)
+    return text, [{"page": 1, "source": "ocr", "chars": len(text)}]
+
+
+def process_ocr_job(job: Dict[str, Any]) -> str:
+    """Runs in a worker thread: OCR the stored upload and create the subject."""
+    file_path = Path(job["file_path"])
+    digest = job.get("content_hash")
+    cached = ocr_jobs.cached_text(digest, OCR_VERSION) if digest else None
+    existing = get_subject(job["subject_id"]) if job.get("subject_id") else None
+    if existing:
+        # Interrupted after the subject was saved: finish it, don't insert a second one
+        print(f"♻️ Resuming OCR job {job['id']} from subject {existing['id']}")
+        subject_id, extracted_text = existing["id"], existing["text"]
+        sources = cached[1] if cached else json.loads(existing["page_sources_json"] or "[]")
+    else:
+        if cached:
+            extracted_text, sources = cached
+            print(f"♻️ Reusing extracted text for {job['file_name']} ({digest[:12]})")
+        else:
+            extracted_text, sources = extract_upload_text(job["file_name"], file_path)
+        if not extracted_text or len(extracted_text.strip()) == 0:
+            raise HTTPException(
+                status_code=422, detail="OCR yielded no text. Try a clearer scan.")
+        if digest and not cached:
+            ocr_jobs.cache_text(digest, OCR_VERSION, extracted_text, sources)
+
+        subject_id = save_subject(
+            job["subject_name"], extracted_text, job["file_name"], None, saved_path=file_path)
+        ocr_jobs.set_subject(job["id"], subject_id)
+
+    update_page_sources(subject_id, sources)
+
+    try:
+        update_outline(subject_id, extract_outline(extracted_text))
+    except Exception as e:
+        print(f"⚠️ Could not save outline JSON: {e}")
+
+    try:
+        save_structured(subject_id, parse_syllabus_structured(extracted_text))
+    except Exception as e:
+        print(f"⚠️ Could not save structured syllabus: {e}")
+
+    bump_generation()
+    run_rag_upsert(subject_id)
+    return subject_id
+
+
+ocr_jobs = OcrJobStore(DB_PATH)
+ocr_runner = OcrJobRunner(ocr_jobs, process_ocr_job)
+
+
+@app.post("/ocr/syllabus", status_code=202)
 async def upload_syllabus(
-    background_tasks: BackgroundTasks,
     subject_name: str = Form(...),
     file: UploadFile = File(...)
 ):
+    """
+    Stores the upload and queues it for OCR. Poll /ocr/jobs/{job_id} for the
+    result; the subject is created when the job is done.
+    """
     if not subject_name or len(subject_name.strip()) < 2:
         raise HTTPException(
             status_code=400, detail="Subject name is required.")
@@ -699,32 +970,13 @@ async def upload_syllabus(
             status_code=400, detail="Invalid file format. Use PDF or image (png/jpg/jpeg/webp).")
 
     try:
-        file_bytes = await file.read()
-        if not file_bytes:
-            raise HTTPException(
-                status_code=400, detail="Uploaded file is empty.")
-
-        if name_lower.endswith(".pdf"):
-            extracted_text = ocr_pdf_bytes(file_bytes)
-        else:
-            extracted_text = ocr_image_bytes(file_bytes)
+        # Starlette has already spooled the part to a temp file; copy it in chunks
+        digest, saved_path = await run_in_threadpool(store_upload, filename, file.file)
+        job_id = ocr_jobs.create(
+            subject_name.strip(), filename, saved_path, content_hash=digest)
+        ocr_runner.submit(job_id)
 
-        if not extracted_text or len(extracted_text.strip()) == 0:
-            raise HTTPException(
-                status_code=422, detail="OCR yielded no text. Try a clearer scan.")
-
-        subject_id = save_subject(
-            subject_name.strip(), extracted_text, filename, file_bytes)
-
-        outline = extract_outline(extracted_text)
-        try:
-            update_outline(subject_id, outline)
-        except Exception as e:
-            print(f"⚠️ Could not save outline JSON: {e}")
-
-        rebuild_index_background(background_tasks)
-
-        return {"subject_id": subject_id, "text": extracted_text, "name": subject_name.strip(), "outline": outline}
+        return {"job_id": job_id, "status": "queued", "status_url": f"/ocr/jobs/{job_id}"}
     except HTTPException:
         raise
     except Exception as e:
@@ -733,25 +985,61 @@ async def upload_syllabus(
             status_code=500, detail=f"OCR processing error: {str(e)}")
 
 
+@app.get("/ocr/jobs/{job_id}")
+async def get_ocr_job(job_id: str):
+    job = ocr_jobs.get(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+
+    out = {
+        "job_id": job["id"],
+        "status": job["status"],
+        "name": job["subject_name"],
+        "file_name": job["file_name"],
+        "subject_id": job["subject_id"],
+        "error": job["error"],
+        "created_at": job["created_at"],
+        "updated_at": job["updated_at"],
+    }
+    if job["status"] == "done" and job["subject_id"]:
+        s = get_subject(job["subject_id"])
+        if s:
+            out["text"] = s["text"]
+            out["outline"] = json.loads(s["outline_json"] or '{"chapters": []}')
+            out["pages"] = json.loads(s["page_sources_json"] or "[]")
+    return out
+
+
 @app.get("/ocr/syllabus")
-async def get_syllabus_list():
+async def get_syllabus_list(request: Request):
     try:
         items = list_subjects()
-        return {"items": items}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+    # The list is small (no text), so its ETag is just a hash of it
+    etag = make_etag("list", json.dumps(items, sort_keys=True))
+    if etag_matches(request, etag):
+        return not_modified(etag)
+    return cached_json({"items": items}, etag)
 
 
 @app.get("/ocr/syllabus/{subject_id}")
-async def get_syllabus(subject_id: str):
+async def get_syllabus(subject_id: str, request: Request):
+    v = get_subject_version(subject_id=subject_id)
+    if not v:
+        raise HTTPException(status_code=404, detail="Subject not found")
+    etag = make_etag("subject", v["id"], v["row_version"])
+    if etag_matches(request, etag):
+        return not_modified(etag)
+
     s = get_subject(subject_id)
     if not s:
         raise HTTPException(status_code=404, detail="Subject not found")
-    return {"id": s["id"], "name": s["name"], "text": s["text"], "created_at": s["created_at"], "outline": json.loads(s["outline_json"] or '{"chapters": []}')}
+    return cached_json({"id": s["id"], "name": s["name"], "text": s["text"], "created_at": s["created_at"], "outline": json.loads(s["outline_json"] or '{"chapters": []}'), "pages": json.loads(s["page_sources_json"] or "[]")}, etag)
 
 
 @app.get("/syllabus/topics/{subject_name}")
-async def get_topics_by_subject(subject_name: str):
+async def get_topics_by_subject(subject_name: str, request: Request):
     """
     Returns structured syllabus for a subject:
 
@@ -762,309 +1050,116 @@ async def get_topics_by_subject(subject_name: str):
       "reference_books": [ ... ]
     }
     """
+    v = get_subject_version(subject_name=subject_name)
+    if not v:
+        raise HTTPException(status_code=404, detail="Subject not found")
+    # A row from an older parser is re-parsed (and its version bumped) below
+    current = v["parsed"] and v["parser_version"] == PARSER_VERSION
+    etag = make_etag("topics", v["id"], v["row_version"], PARSER_VERSION)
+    if current and etag_matches(request, etag):
+        return not_modified(etag)
+
     row = get_subject_by_name(subject_name)
     if not row:
         raise HTTPException(status_code=404, detail="Subject not found")
 
-    text = row["text"] or ""
-
-    # --------- helpers local to this endpoint ---------
-    def parse_modules_and_units(txt: str):
-        lines = [ln.strip() for ln in txt.splitlines() if ln.strip()]
-        modules = []
-        current_module = None
-        current_unit = None
-        in_theory = False
-
-        for line in lines:
-            low = line.lower()
-
-            # Enter theory component section
-            if not in_theory:
-                if "theory component" in low:
-                    in_theory = True
-                continue
-
-            # Stop parsing modules/units when lab or books section starts
-            if re.search(r"\blaboratory component\b", low):
-                break
-            if low.startswith("text books") or low.startswith("textbooks"):
-                break
-            if low.startswith("reference books"):
-                break
-
-            # Skip table header lines like "Module | Unit No. No."
-            if "module" in low and "unit" in low and "no" in low:
-                continue
-            if low.startswith("topics ref"):
-                continue
-            if low.startswith("total "):
-                continue
-
-            # Module line: "1 Title | Introduction to Distributed Systems"
-            m_mod = re.match(r"^(\d+)\s+Title\b[:|]?\s*(.+)$", line, re.I)
-            if m_mod:
-                module_no = int(m_mod.group(1))
-                title = m_mod.group(2).strip().rstrip(".")
-                current_module = {
-                    "module_no": module_no,
-                    "title": title,
-                    "units": [],
-                }
-                modules.append(current_module)
-                current_unit = None
-                continue
-
-            # Special case: Self Study line like "6 Self | Cloud Computing..."
-            m_self = re.match(r"^(\d+)\s+Self\b.*", line, re.I)
-            if m_self:
-                module_no = int(m_self.group(1))
-                current_module = {
-                    "module_no": module_no,
-                    "title": "Self Study",
-                    "units": [],
-                }
-                modules.append(current_module)
-                current_unit = None
-
-                # Treat same line content after '|' as a unit 6.1
-                if "|" in line:
-                    after_pipe = line.split("|", 1)[1].strip()
-                    after_pipe = after_pipe.split("|", 1)[0].strip()
-                    if after_pipe:
-                        current_unit = {
-                            "unit_no": f"{module_no}.1",
-                            "content": after_pipe,
-                        }
-                        current_module["units"].append(current_unit)
-                continue
-
-            # Unit lines
-            if current_module:
-                # pattern with pipe: "1.1 | Definition ..."
-                m_unit = re.match(r"^(\d+(?:\.\d+)?)\s*\|\s*(.+)$", line)
-                if not m_unit:
-                    # fallback without pipe: "3.2 Clock Synchronization: ..."
-                    m_unit = re.match(r"^(\d+(?:\.\d+)?)\s+(.+)$", line)
-                if m_unit:
-                    num_str = m_unit.group(1).strip()
-                    rest = m_unit.group(2).strip()
-
-                    # ignore if this actually looks like a module header
-                    if rest.lower().startswith("title"):
-                        continue
-
-                    # Fix common OCR like "41" instead of "4.1"
-                    unit_no = num_str
-                    if (
-                        "." not in num_str
-                        and len(num_str) == 2
-                        and str(current_module["module_no"]) == num_str[0]
-                    ):
-                        unit_no = f"{num_str[0]}.{num_str[1]}"
-
-                    # Remove everything after next '|' (reference / hours columns)
-                    rest = rest.split("|", 1)[0].strip()
-
-                    if rest:
-                        current_unit = {
-                            "unit_no": unit_no,
-                            "content": rest,
-                        }
-                        current_module["units"].append(current_unit)
-                    else:
-                        current_unit = None
-                    continue
-
-            # Continuation lines for current unit
-            if current_module and current_unit:
-                # Avoid headers we've not caught
-                if re.match(r"^\d+\s+Title\b", line, re.I):
-                    continue
-                if line.lower().startswith(
-                    ("text books", "reference books", "laboratory component")
-                ):
-                    continue
-
-                cont = line.split("|", 1)[0].strip()
-                if not cont:
-                    continue
-                if not current_unit["content"].endswith((" ", "-", "/")):
-                    current_unit["content"] += " "
-                current_unit["content"] += cont
-                continue
-
-        # Cleanup text
-        for mod in modules:
-            for u in mod.get("units", []):
-                if not isinstance(u.get("content"), str):
-                    continue
-                content = re.sub(r"\s+", " ", u["content"]).strip()
-                u["content"] = content
-
-        return modules
-
-    def parse_book_entry(raw: str):
-        """
-        Parse a single textbook/reference book entry line into
-        {title, authors, publisher, edition}.
-        Best-effort, robust to OCR noise.
-        """
-        s = raw.replace("|", " ")
-        s = re.sub(r"\s+", " ", s).strip()
-        # remove leading index number
-        s = re.sub(r"^\d+\s+", "", s)
-
-        # Remove trailing year if any
-        year_match = re.search(r"(19|20)\d{2}", s)
-        if year_match:
-            s_wo_year = s[:year_match.start()].strip()
-        else:
-            s_wo_year = s
+    structured = get_structured(row)
+    if not current or row["id"] != v["id"]:
+        v = get_subject_version(subject_id=row["id"]) or v
+        etag = make_etag("topics", v["id"], v["row_version"], PARSER_VERSION)
 
-        PUBLISHER_PAT = (
-            r"(Pearson(?:\s+Education)?|PHI|Cambridge(?:\s+University\s+Press)?|"
-            r"MIT\s+Press|Research\s+India|McGraw[-\s]?Hill|Wiley|Springer|"
-            r"Oxford(?:\s+University\s+Press)?)"
-        )
-
-        # Edition
-        ed_match = re.search(
-            r"\b[\w\d]+(?:st|nd|rd|th)?\s+Edition\b", s_wo_year, re.I)
-
-        title = ""
-        authors = ""
-        publisher = ""
-        edition = ""
-
-        if ed_match:
-            edition = ed_match.group(0).strip()
-            before_ed = s_wo_year[:ed_match.start()].strip()
-            after_ed = s_wo_year[ed_match.end():].strip()
-            title = before_ed.rstrip(".,;")
-
-            if after_ed:
-                m_pub = re.search(PUBLISHER_PAT, after_ed)
-                if m_pub:
-                    authors = after_ed[:m_pub.start()].strip().rstrip(",;")
-                    publisher = after_ed[m_pub.start():].strip().rstrip(".,;")
-                else:
-                    authors = after_ed.strip().rstrip(",;")
-        else:
-            # No edition, try to find publisher directly
-            m_pub = re.search(PUBLISHER_PAT, s_wo_year)
-            if m_pub:
-                before_p = s_wo_year[:m_pub.start()].strip()
-                publisher = s_wo_year[m_pub.start():].strip().rstrip(".,;")
-                title = before_p.rstrip(".,;")
-            else:
-                title = s_wo_year.rstrip(".,;")
-
-        return {
-            "title": title,
-            "authors": authors,
-            "publisher": publisher,
-            "edition": edition,
-        }
-
-    def extract_books_from_text(txt: str, header_pattern: str, stop_patterns):
-        """
-        Extract list of books from a section starting with header_pattern,
-        stopping before any of stop_patterns.
-        """
-        lines = [ln.strip() for ln in txt.splitlines() if ln.strip()]
-        n = len(lines)
-
-        header_idx = -1
-        for i, l in enumerate(lines):
-            if re.search(header_pattern, l, re.I):
-                header_idx = i
-                break
-        if header_idx == -1:
-            return []
-
-        stop_idx = n
-        if stop_patterns:
-            for i in range(header_idx + 1, n):
-                low = lines[i].lower()
-                if any(re.search(sp, low) for sp in stop_patterns):
-                    stop_idx = i
-                    break
-
-        section_lines = [ln for ln in lines[header_idx + 1:stop_idx] if ln]
-        # Remove header row like "Sr. No | Title Edition Authors Publisher Year"
-        section_lines = [
-            ln for ln in section_lines
-            if not re.match(r"^sr\.", ln, re.I)
-        ]
-
-        books_raw = []
-        current = ""
-
-        for ln in section_lines:
-            if re.match(r"^\d+\s", ln):
-                if current:
-                    books_raw.append(current.strip())
-                current = ln
-            else:
-                if current:
-                    current += " " + ln
-        if current:
-            books_raw.append(current.strip())
-
-        books = []
-        for raw in books_raw:
-            entry = parse_book_entry(raw)
-            if entry.get("title"):
-                books.append(entry)
-
-        return books
-
-    def parse_syllabus_structured(txt: str):
-        modules = parse_modules_and_units(txt)
-        textbooks = extract_books_from_text(
-            txt,
-            header_pattern=r"^text\s*books",
-            stop_patterns=[r"^reference\s*books"],
-        )
-        reference_books = extract_books_from_text(
-            txt,
-            header_pattern=r"^reference\s*books",
-            stop_patterns=[],
-        )
-        return {
-            "modules": modules,
-            "textbooks": textbooks,
-            "reference_books": reference_books,
-        }
-
-    # --------- actual logic ---------
-    structured = parse_syllabus_structured(text)
-
-    return {
+    return cached_json({
         "subject": row["name"],
         "modules": structured.get("modules", []),
         "textbooks": structured.get("textbooks", []),
         "reference_books": structured.get("reference_books", []),
-    }
+    }, etag)
 
 
 @app.post("/syllabus/reparse/{subject_id}")
-async def reparse_outline(subject_id: str):
+async def reparse_outline(subject_id: str, background_tasks: BackgroundTasks):
     row = get_subject(subject_id)
     if not row:
         raise HTTPException(status_code=404, detail="Subject not found")
 
     outline = extract_outline(row["text"] or "")
     update_outline(subject_id, outline)
+    save_structured(subject_id, parse_syllabus_structured(row["text"] or ""))
+    bump_generation()
+    index_subject_background(background_tasks, subject_id)
     return {"subject": row["name"], "chapters": outline.get("chapters", [])}
 
+
+@app.get("/syllabus/search")
+async def search_syllabus_topics(q: str, limit: int = 20, subject_id: Optional[str] = None):
+    """
+    Which subjects/modules/units/books mention a topic, best match first:
+    {"query": ..., "results": [{"subject_id", "subject", "kind", "module_no",
+    "module_title", "unit_no", "text", "snippet", "score"}, ...]}
+    """
+    if not q.strip():
+        raise HTTPException(status_code=400, detail="Query is required.")
+    limit = max(1, min(limit, 100))
+    results = await run_in_threadpool(search_syllabus, DB_PATH, q, limit, subject_id)
+    return {"query": q, "results": results}
+
+
+# Progress of the current/last bulk reparse (one at a time)
+reparse_state: Dict[str, Any] = {"status": "idle"}
+
+
+async def run_bulk_reparse(stale_only: bool):
+    def on_progress(state: Dict[str, Any]):
+        reparse_state.update(
+            total=state["total"], done=state["done"], failed=state["failed"], elapsed_s=state["elapsed_s"])
+
+    try:
+        state = await asyncio.to_thread(
+            reparse_subjects, DB_PATH, stale_only=stale_only, progress=on_progress)
+        reparse_state.update(errors=state["errors"][:20])
+        if state["done"]:
+            bump_generation()
+            # Per-subject upserts, not a rebuild: a rebuild would drop chunks
+            # that OCR jobs upsert while it is embedding
+            for sid in state["ids"]:
+                await asyncio.to_thread(run_rag_upsert, sid)
+        reparse_state.update(status="done", finished_at=datetime.utcnow().isoformat())
+        print(f"✅ Bulk reparse done: {state['done']}/{state['total']} in {state['elapsed_s']}s")
+    except Exception as e:
+        reparse_state.update(status="failed", error=str(e), finished_at=datetime.utcnow().isoformat())
+        print(f"❌ Bulk reparse failed: {e}")
+
+
+@app.post("/syllabus/reparse", status_code=202)
+async def reparse_all(stale: bool = False):
+    """
+    Re-parses every subject (or, with ?stale=true, those parsed by an older
+    parser) in the background. Poll /syllabus/reparse/status for progress.
+    """
+    if reparse_state.get("status") == "running":
+        raise HTTPException(status_code=409, detail="A bulk reparse is already running")
+    reparse_state.clear()
+    reparse_state.update(status="running", stale_only=stale, total=None, done=0, failed=0,
+                         elapsed_s=0.0, started_at=datetime.utcnow().isoformat())
+    app.state.reparse = asyncio.create_task(run_bulk_reparse(stale))
+    return {"status": "running", "status_url": "/syllabus/reparse/status"}
+
+
+@app.get("/syllabus/reparse/status")
+async def reparse_status():
+    return reparse_state
+
 # -------------------- Startup --------------------
 
 
 @app.on_event("startup")
 async def on_startup():
     init_db()
+    indexed = sync_search_index(DB_PATH)
+    if indexed:
+        print(f"🔎 Indexed {indexed} subject(s) for search.")
+    warm_pool()
+    app.state.ocr_health = asyncio.create_task(pool_health_loop())
     # Try to init chatbot without breaking the server if deps/models are missing
     try:
         from app import chatbot as cb
@@ -1073,8 +1168,20 @@ async def on_startup():
         run_rag_rebuild()
     except Exception as e:
         print(f"ℹ️ Chatbot init skipped or failed: {e}")
+    resumed = ocr_runner.resume()
+    if resumed:
+        print(f"🔁 Resumed {resumed} unfinished OCR job(s).")
     print("✅ Server ready!")
 
+
+@app.on_event("shutdown")
+async def on_shutdown():
+    task = getattr(app.state, "ocr_health", None)
+    if task:
+        task.cancel()
+    shutdown_pool()
+    close_pools()
+
 # Allow: python -m app.main
 if __name__ == "__main__":
     import uvicorn
@@ -0,0 +1,487 @@
+# app/ocr.py
+"""
+Text extraction for uploaded syllabi (PDF text layer, PyMuPDF rendering,
+Tesseract OCR).
+
+Each PDF page uses its text layer when it has one. Only image-only pages
+are rendered, straight to grayscale samples at a per-page zoom, and OCR'd
+across a process pool (OCR_WORKERS, default: CPU count); results are
+reassembled in page order. The pool uses the spawn start method so workers
+only import this module, not the API app. Workers are long-lived: with
+tesserocr installed each keeps one Tesseract engine loaded; without it,
+pages go to the tesseract CLI OCR_BATCH_PAGES at a time, one process per
+batch. A periodic health check restarts the pool if a worker has died.
+"""
+
+import io
+import os
+import re
+import asyncio
+import tempfile
+import functools
+import itertools
+import threading
+import multiprocessing
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeout
+from concurrent.futures.process import BrokenProcessPool
+from pathlib import Path
+from typing import Any, Deque, Dict, Iterable, Iterator, List, Optional, Tuple, Union
+
+from fastapi import HTTPException
+
+# Optional OCR deps (don’t block CSV upload if missing)
+try:
+    from PIL import Image  # type: ignore
+except Exception:
+    Image = None  # type: ignore
+
+try:
+    import pytesseract  # type: ignore
+except Exception:
+    pytesseract = None  # type: ignore
+
+# Tesseract's C API: when installed, each worker keeps one engine loaded
+# instead of pytesseract starting a tesseract process (and reloading the
+# language data) for every image.
+try:
+    import tesserocr  # type: ignore
+except Exception:
+    tesserocr = None  # type: ignore
+
+try:
+    import fitz  # PyMuPDF  # type: ignore
+except Exception:
+    fitz = None  # type: ignore
+
+# Bump when extraction output changes; cached OCR text from older versions is ignored
+OCR_VERSION = 1
+
+OCR_WORKERS = int(os.getenv("OCR_WORKERS", "0")) or (os.cpu_count() or 1)
+# A PDF page with at least this much embedded text skips OCR
+OCR_MIN_PAGE_CHARS = int(os.getenv("OCR_MIN_PAGE_CHARS", "50"))
+# Render scale for image-only pages (see page_zoom)
+OCR_MAX_PIXELS = int(os.getenv("OCR_MAX_PIXELS", "12000000"))
+OCR_DEFAULT_ZOOM = 2.0
+OCR_MIN_ZOOM = 1.0
+# Pages per tesseract run when tesserocr is not installed
+OCR_BATCH_PAGES = int(os.getenv("OCR_BATCH_PAGES", "4"))
+
+# Seconds between pool health checks, and how long a ping may take
+OCR_HEALTH_INTERVAL = float(os.getenv("OCR_HEALTH_INTERVAL", "30"))
+OCR_HEALTH_TIMEOUT = float(os.getenv("OCR_HEALTH_TIMEOUT", "10"))
+
+# (width, height, stride, 8-bit grayscale samples) of a rendered page
+GrayPage = Tuple[int, int, int, bytes]
+
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_lock = threading.Lock()
+# tesserocr engines aren't thread-safe: one per thread. Pool workers are
+# single-threaded, so each holds one; with OCR_WORKERS < 2, each API worker
+# thread running OCR gets its own.
+_engines = threading.local()
+
+
+# -------------------- Tesseract configuration --------------------
+
+
+def setup_tesseract_cmd():
+    if pytesseract is None:
+        if tesserocr is None:
+            print("ℹ️ pytesseract not installed. OCR endpoints will be limited.")
+        return
+
+    env_path = os.getenv("TESSERACT_CMD")
+    if env_path and Path(env_path).exists():
+        pytesseract.pytesseract.tesseract_cmd = env_path
+        return
+
+    win_path = r"C:\Program Files\Tesseract-OCR\tesseract.exe"
+    if Path(win_path).exists():
+        pytesseract.pytesseract.tesseract_cmd = win_path
+        return
+
+    for p in ["/usr/bin/tesseract", "/usr/local/bin/tesseract", "/opt/homebrew/bin/tesseract"]:
+        if Path(p).exists():
+            pytesseract.pytesseract.tesseract_cmd = p
+            return
+
+    print("⚠️ Tesseract path not explicitly set. Ensure tesseract is in PATH or set TESSERACT_CMD env var.")
+
+
+# Runs in the API process and again in every spawned pool worker
+setup_tesseract_cmd()
+
+# -------------------- Process pool --------------------
+
+
+def _ocr_available() -> bool:
+    return Image is not None and (tesserocr is not None or pytesseract is not None)
+
+
+def _get_engine():
+    engine = getattr(_engines, "api", None)
+    if engine is None:
+        engine = _engines.api = tesserocr.PyTessBaseAPI(lang="eng")
+    return engine
+
+
+def _worker_entry(fn):
+    """
+    Pool entry points re-raise errors as plain RuntimeErrors. Some library
+    exceptions (pytesseract.TesseractNotFoundError) can't be unpickled in
+    the parent, which then reports a broken pool instead of the error.
+    """
+    @functools.wraps(fn)
+    def wrapper(*args):
+        try:
+            return fn(*args)
+        except Exception as e:
+            raise RuntimeError(str(e)) from None
+    return wrapper
+
+
+def _init_worker():
+    # Load the language data once per worker, not once per page. A failing
+    # initializer breaks the whole pool; leave the error to the first page.
+    if tesserocr is not None:
+        try:
+            _get_engine()
+        except Exception as e:
+            print(f"⚠️ Could not load Tesseract in OCR worker: {e}")
+
+
+@_worker_entry
+def _ping() -> int:
+    if tesserocr is not None:
+        _get_engine()
+    return os.getpid()
+
+
+def get_pool() -> ProcessPoolExecutor:
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(
+                max_workers=OCR_WORKERS, mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_worker)
+        return _pool
+
+
+def warm_pool():
+    """Start the workers now so the first scanned upload doesn't pay for spawning them."""
+    if not _ocr_available() or OCR_WORKERS < 2:
+        return
+    pool = get_pool()
+    for _ in range(OCR_WORKERS):
+        pool.submit(_ping)
+
+
+def shutdown_pool():
+    global _pool
+    with _pool_lock:
+        pool, _pool = _pool, None
+    if pool is not None:
+        pool.shutdown(wait=False, cancel_futures=True)
+
+
+def restart_pool(failed: ProcessPoolExecutor):
+    """
+    Replace a broken pool. Several callers can see the same crash, so only
+    the first one swaps it out; the rest find a new pool and just use it.
+    """
+    global _pool
+    with _pool_lock:
+        if _pool is not failed:
+            return
+        _pool = None
+    failed.shutdown(wait=False, cancel_futures=True)
+    warm_pool()
+
+
+def check_pool() -> bool:
+    """
+    Ping the workers. A dead worker breaks the whole executor, so restart it
+    now rather than on the next upload. A slow ping only means the workers
+    are busy with pages and is not treated as a failure.
+    """
+    pool = _pool
+    if pool is None:
+        return True
+    try:
+        pool.submit(_ping).result(timeout=OCR_HEALTH_TIMEOUT)
+        return True
+    except BrokenProcessPool as e:
+        print(f"⚠️ OCR pool unhealthy ({e}); restarting workers.")
+        restart_pool(pool)
+        return False
+    except FutureTimeout:
+        return True
+
+
+async def pool_health_loop():
+    while True:
+        await asyncio.sleep(OCR_HEALTH_INTERVAL)
+        try:
+            await asyncio.to_thread(check_pool)
+        except Exception as e:
+            print(f"⚠️ OCR health check failed: {e}")
+
+# -------------------- OCR helpers --------------------
+
+
+def clean_text(text: str) -> str:
+    text = re.sub(r"\r\n", "\n", text)
+    text = re.sub(r"[ \t]+", " ", text)
+    text = re.sub(r"\n{3,}", "\n\n", text).strip()
+    return text
+
+
+def _require_ocr():
+    if not _ocr_available():
+        raise HTTPException(
+            status_code=503, detail="OCR dependencies not installed on server.")
+
+
+def _require_pdf():
+    if fitz is None:
+        raise HTTPException(
+            status_code=503, detail="PDF OCR dependencies not installed on server.")
+
+
+def _image_to_string(img) -> str:
+    if tesserocr is not None:
+        api = _get_engine()
+        api.SetImage(img)
+        return api.GetUTF8Text()
+    return pytesseract.image_to_string(img, lang="eng")
+
+
+@_worker_entry
+def _ocr_page(src: Union[bytes, str, Path]) -> str:
+    # Pool worker entry point
+    img = Image.open(io.BytesIO(src) if isinstance(src, bytes) else src).convert("RGB")
+    return clean_text(_image_to_string(img))
+
+
+def _ocr_gray(page: GrayPage) -> str:
+    # One rendered PDF page (raw 8-bit samples)
+    width, height, stride, samples = page
+    if tesserocr is not None:
+        api = _get_engine()
+        api.SetImageBytes(samples, width, height, 1, stride)
+        return clean_text(api.GetUTF8Text())
+    img = Image.frombuffer("L", (width, height), samples, "raw", "L", stride, 1)
+    # pytesseract hands Tesseract a temp file in img.format; PGM needs no compression
+    img.format = "PPM"
+    return clean_text(pytesseract.image_to_string(img, lang="eng"))
+
+
+@_worker_entry
+def _ocr_gray_batch(pages: List[GrayPage]) -> List[str]:
+    # Pool worker entry point for rendered PDF pages. Without tesserocr, one tesseract process reads
+    # the whole batch from a list file instead of starting once per page.
+    if tesserocr is not None or len(pages) == 1:
+        return [_ocr_gray(p) for p in pages]
+    with tempfile.TemporaryDirectory(prefix="ocr_") as tmpdir:
+        paths = []
+        for i, (width, height, stride, samples) in enumerate(pages):
+            path = os.path.join(tmpdir, f"{i}.pgm")
+            Image.frombuffer("L", (width, height), samples, "raw", "L", stride, 1).save(path, format="PPM")
+            paths.append(path)
+        listing = os.path.join(tmpdir, "pages.txt")
+        with open(listing, "w", encoding="utf-8") as f:
+            f.write("\n".join(paths) + "\n")
+        text = pytesseract.image_to_string(listing, lang="eng")
+    # Tesseract ends every page's text with a form feed
+    parts = text.split("\f")
+    if len(parts) < len(pages):
+        raise RuntimeError(f"Tesseract returned {len(parts)} page(s) for a batch of {len(pages)}.")
+    return [clean_text(t) for t in parts[:len(pages)]]
+
+
+def _batches(pages: Iterator[GrayPage]) -> Iterator[List[GrayPage]]:
+    # tesserocr has no per-page process to save, so keep one page per task
+    size = 1 if tesserocr is not None else max(1, OCR_BATCH_PAGES)
+    while True:
+        batch = list(itertools.islice(pages, size))
+        if not batch:
+            return
+        yield batch
+
+
+def _in_pool(fn, arg):
+    """Run one call in the pool, restarting the pool once if a worker dies."""
+    for attempt in (1, 2):
+        pool = get_pool()
+        try:
+            return pool.submit(fn, arg).result()
+        except BrokenProcessPool as e:
+            print(f"⚠️ OCR worker crashed ({e}); restarting the pool.")
+            restart_pool(pool)
+    raise RuntimeError("OCR worker crashed twice on the same image.")
+
+
+def ocr_image_bytes(img_bytes: bytes) -> str:
+    _require_ocr()
+    if OCR_WORKERS < 2:
+        return _ocr_page(img_bytes)
+    return _in_pool(_ocr_page, img_bytes)
+
+
+def ocr_image_file(path: Union[str, Path]) -> str:
+    _require_ocr()
+    if OCR_WORKERS < 2:
+        return _ocr_page(Path(path))
+    return _in_pool(_ocr_page, Path(path))
+
+
+def _drain(pool: ProcessPoolExecutor, remaining: Iterator[GrayPage],
+           pending: Deque[list], results: List[str]):
+    window = OCR_WORKERS * 2
+    for batch in _batches(remaining):
+        # Track the pages before submitting so a crash can't lose them
+        item = [batch, None]
+        pending.append(item)
+        item[1] = pool.submit(_ocr_gray_batch, batch)
+        if len(pending) >= window:
+            results.extend(pending[0][1].result())
+            pending.popleft()
+    while pending:
+        results.extend(pending[0][1].result())
+        pending.popleft()
+
+
+def ocr_pages(pages: Iterable[GrayPage]) -> List[str]:
+    """
+    OCR rendered pages in parallel; results come back in page order. Pages are
+    consumed lazily with at most 2 x OCR_WORKERS tasks (a page, or a batch
+    without tesserocr) in flight, so only a few rendered pages are in memory
+    at once. If a worker dies, the pool is restarted and the pages that were
+    in flight are OCR'd again.
+    """
+    _require_ocr()
+    if OCR_WORKERS < 2:
+        return [text for batch in _batches(iter(pages)) for text in _ocr_gray_batch(batch)]
+
+    pending: Deque[list] = deque()
+    results: List[str] = []
+    remaining: Iterator[GrayPage] = iter(pages)
+    for attempt in (1, 2):
+        pool = get_pool()
+        try:
+            _drain(pool, remaining, pending, results)
+            return results
+        except BrokenProcessPool as e:
+            print(f"⚠️ OCR worker crashed ({e}); restarting the pool.")
+            restart_pool(pool)
+            lost = [page for item in pending for page in item[0]]
+            pending.clear()
+            remaining = itertools.chain(lost, remaining)
+        except Exception:
+            # An OCR error, not a crash: the pool is fine, just drop this document
+            for _, future in pending:
+                if future is not None:
+                    future.cancel()
+            raise
+    raise RuntimeError("OCR workers crashed twice on this document.")
+
+
+def _scan_scale(page, page_area: float) -> Optional[float]:
+    """Pixels per point of the scanned image covering the page, if there is one."""
+    # get_images() only reads the page resources; get_image_info() parses the content
+    if not page.get_images():
+        return None
+    best = None
+    for info in page.get_image_info():
+        bbox = fitz.Rect(info["bbox"]) & page.rect
+        if bbox.is_empty or bbox.width <= 0:
+            continue
+        if best is None or bbox.width * bbox.height > best[0]:
+            best = (bbox.width * bbox.height, info["width"] / bbox.width)
+    # Only trust it when the image is the page, not a logo on it
+    if best and best[0] >= 0.5 * page_area:
+        return best[1]
+    return None
+
+
+def page_zoom(page) -> float:
+    """
+    Render scale for one page: OCR_DEFAULT_ZOOM, or a scanned page's own
+    resolution when that is lower (upsampling a low-dpi scan only costs
+    time). Never above OCR_DEFAULT_ZOOM, and capped at OCR_MAX_PIXELS.
+    """
+    rect = page.rect
+    page_area = rect.width * rect.height
+    if page_area <= 0:
+        return OCR_MIN_ZOOM
+
+    zoom = OCR_DEFAULT_ZOOM
+    try:
+        scale = _scan_scale(page, page_area)
+        if scale:
+            zoom = min(zoom, scale)
+    except Exception:
+        pass
+
+    zoom = min(zoom, (OCR_MAX_PIXELS / page_area) ** 0.5)
+    return max(OCR_MIN_ZOOM, zoom)
+
+
+def render_page_gray(page) -> GrayPage:
+    """Render straight to 8-bit grayscale samples; no PNG encode/decode."""
+    zoom = page_zoom(page)
+    pix = page.get_pixmap(matrix=fitz.Matrix(zoom, zoom), colorspace=fitz.csGRAY, alpha=False)
+    return pix.width, pix.height, pix.stride, pix.samples
+
+
+def _open_pdf(source: Union[bytes, str, Path]):
+    if isinstance(source, (bytes, bytearray)):
+        return fitz.open(stream=source, filetype="pdf")
+    # From disk: MuPDF reads pages on demand instead of holding the whole file
+    return fitz.open(str(source), filetype="pdf")
+
+
+def extract_pdf_pages(source: Union[bytes, str, Path]) -> List[Dict[str, Any]]:
+    """
+    One entry per page, in order: {"page", "source", "text"} where source is
+    "text" (embedded text layer), "ocr", or "skipped" (image-only page while
+    OCR is not installed). Accepts PDF bytes or a path.
+    """
+    _require_pdf()
+    pages: List[Dict[str, Any]] = []
+    scanned: List[int] = []
+    with _open_pdf(source) as doc:
+        for i, page in enumerate(doc):
+            text = page.get_text("text")
+            if len(text.strip()) >= OCR_MIN_PAGE_CHARS:
+                pages.append({"page": i + 1, "source": "text", "text": clean_text(text)})
+                continue
+            pages.append({"page": i + 1, "source": "ocr", "text": ""})
+            scanned.append(i)
+
+        if scanned and not _ocr_available():
+            if len(scanned) == len(pages):
+                _require_ocr()
+            for i in scanned:
+                pages[i]["source"] = "skipped"
+            return pages
+
+        texts = ocr_pages(render_page_gray(doc[i]) for i in scanned)
+
+    for i, text in zip(scanned, texts):
+        pages[i]["text"] = text
+    return pages
+
+
+def join_pages(pages: List[Dict[str, Any]]) -> str:
+    return clean_text("\n\n".join(p["text"] for p in pages if p["text"]))
+
+
+def ocr_pdf_bytes(pdf_bytes: bytes) -> str:
+    return join_pages(extract_pdf_pages(pdf_bytes))
+
+
+def page_sources(pages: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """What gets recorded per page: where its text came from and how much."""
+    return [{"page": p["page"], "source": p["source"], "chars": len(p["text"])} for p in pages]
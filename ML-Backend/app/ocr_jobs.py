@@ -0,0 +1,177 @@
+# app/ocr_jobs.py
+"""
+Background OCR jobs for syllabus uploads.
+
+The upload handler stores the file, records a job in SQLite and returns its
+id straight away; the OCR itself runs off the event loop, at most
+OCR_JOB_CONCURRENCY jobs at a time. Jobs left queued or running when the
+server stopped are picked up again on startup. Extracted text is cached by
+the upload's content hash, so re-uploading the same file skips OCR.
+"""
+
+import os
+import json
+import asyncio
+import sqlite3
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple, Union
+from uuid import uuid4
+
+from app.db import pool_for
+
+
+OCR_JOB_CONCURRENCY = int(os.getenv("OCR_JOB_CONCURRENCY", "2"))
+
+
+class OcrJobStore:
+    def __init__(self, db_path: Union[str, Path]):
+        self.db_path = db_path
+        self.db = pool_for(db_path)
+        with self.db.connection() as con:
+            con.execute(
+                """
+                CREATE TABLE IF NOT EXISTS ocr_jobs (
+                    id TEXT PRIMARY KEY,
+                    status TEXT NOT NULL,
+                    subject_name TEXT NOT NULL,
+                    file_name TEXT NOT NULL,
+                    file_path TEXT NOT NULL,
+                    subject_id TEXT,
+                    error TEXT,
+                    created_at TEXT NOT NULL,
+                    updated_at TEXT NOT NULL
+                );
+                """
+            )
+            cols = [r[1] for r in con.execute("PRAGMA table_info('ocr_jobs')").fetchall()]
+            if "content_hash" not in cols:
+                con.execute("ALTER TABLE ocr_jobs ADD COLUMN content_hash TEXT")
+            con.execute(
+                "CREATE INDEX IF NOT EXISTS idx_ocr_jobs_status ON ocr_jobs (status, created_at)")
+            con.execute(
+                """
+                CREATE TABLE IF NOT EXISTS ocr_text_cache (
+                    content_hash TEXT NOT NULL,
+                    ocr_version INTEGER NOT NULL,
+                    text TEXT NOT NULL,
+                    page_sources_json TEXT,
+                    created_at TEXT NOT NULL,
+                    PRIMARY KEY (content_hash, ocr_version)
+                );
+                """
+            )
+            con.commit()
+
+    def create(self, subject_name: str, file_name: str, file_path: Union[str, Path],
+               job_id: Optional[str] = None, content_hash: Optional[str] = None) -> str:
+        jid = job_id or str(uuid4())
+        now = datetime.utcnow().isoformat()
+        with self.db.connection() as con:
+            con.execute(
+                "INSERT INTO ocr_jobs (id, status, subject_name, file_name, file_path, content_hash, created_at, updated_at) "
+                "VALUES (?, 'queued', ?, ?, ?, ?, ?, ?)",
+                (jid, subject_name, file_name, str(file_path), content_hash, now, now),
+            )
+            con.commit()
+        return jid
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        with self.db.connection() as con:
+            con.row_factory = sqlite3.Row
+            row = con.execute(
+                "SELECT * FROM ocr_jobs WHERE id = ?", (job_id,)).fetchone()
+        return dict(row) if row else None
+
+    def update(self, job_id: str, status: str, subject_id: Optional[str] = None,
+               error: Optional[str] = None):
+        with self.db.connection() as con:
+            con.execute(
+                "UPDATE ocr_jobs SET status = ?, subject_id = COALESCE(?, subject_id), error = ?, updated_at = ? "
+                "WHERE id = ?",
+                (status, subject_id, error, datetime.utcnow().isoformat(), job_id),
+            )
+            con.commit()
+
+    def set_subject(self, job_id: str, subject_id: str):
+        """Record the subject as soon as it exists, so a resumed job doesn't insert it again."""
+        with self.db.connection() as con:
+            con.execute(
+                "UPDATE ocr_jobs SET subject_id = ?, updated_at = ? WHERE id = ?",
+                (subject_id, datetime.utcnow().isoformat(), job_id),
+            )
+            con.commit()
+
+    def unfinished(self) -> List[Dict[str, Any]]:
+        with self.db.connection() as con:
+            con.row_factory = sqlite3.Row
+            rows = con.execute(
+                "SELECT * FROM ocr_jobs WHERE status IN ('queued', 'running') ORDER BY created_at").fetchall()
+        return [dict(r) for r in rows]
+
+    def cached_text(self, content_hash: str, ocr_version: int) -> Optional[Tuple[str, List[Dict[str, Any]]]]:
+        """(text, page sources) extracted earlier from a file with this hash."""
+        with self.db.connection() as con:
+            row = con.execute(
+                "SELECT text, page_sources_json FROM ocr_text_cache WHERE content_hash = ? AND ocr_version = ?",
+                (content_hash, ocr_version),
+            ).fetchone()
+        if not row:
+            return None
+        return row[0], json.loads(row[1] or "[]")
+
+    def cache_text(self, content_hash: str, ocr_version: int, text: str,
+                   sources: List[Dict[str, Any]]):
+        with self.db.connection() as con:
+            con.execute(
+                "INSERT OR REPLACE INTO ocr_text_cache (content_hash, ocr_version, text, page_sources_json, created_at) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (content_hash, ocr_version, text, json.dumps(sources), datetime.utcnow().isoformat()),
+            )
+            con.commit()
+
+
+class OcrJobRunner:
+    """
+    Runs process_fn(job) -> subject_id in a thread for each submitted job.
+    A resumed job may already have a subject_id (see set_subject); process_fn
+    should finish that subject instead of creating another.
+    """
+
+    def __init__(self, store: OcrJobStore, process_fn: Callable[[Dict[str, Any]], str],
+                 concurrency: int = None):
+        self.store = store
+        self.process_fn = process_fn
+        self.concurrency = concurrency or OCR_JOB_CONCURRENCY
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._tasks: Dict[str, asyncio.Task] = {}
+
+    def submit(self, job_id: str):
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.concurrency)
+        task = asyncio.ensure_future(self._run(job_id))
+        self._tasks[job_id] = task
+        task.add_done_callback(lambda _: self._tasks.pop(job_id, None))
+
+    async def _run(self, job_id: str):
+        async with self._semaphore:
+            job = await asyncio.to_thread(self.store.get, job_id)
+            if not job or job["status"] not in ("queued", "running"):
+                return
+            await asyncio.to_thread(self.store.update, job_id, "running")
+            try:
+                subject_id = await asyncio.to_thread(self.process_fn, job)
+                await asyncio.to_thread(self.store.update, job_id, "done", subject_id)
+                print(f"✅ OCR job {job_id} done: subject {subject_id}")
+            except Exception as e:
+                detail = getattr(e, "detail", None) or str(e)
+                await asyncio.to_thread(self.store.update, job_id, "failed", None, str(detail))
+                print(f"❌ OCR job {job_id} failed: {detail}")
+
+    def resume(self) -> int:
+        """Requeue jobs interrupted by a restart."""
+        jobs = self.store.unfinished()
+        for job in jobs:
+            self.store.update(job["id"], "queued")
+            self.submit(job["id"])
+        return len(jobs)
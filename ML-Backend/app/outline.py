@@ -0,0 +1,70 @@
+# app/outline.py
+"""
+Chapter/topic outline extraction from syllabus text.
+
+Kept free of app imports so reparse pool workers can load it cheaply.
+"""
+
+import re
+from typing import Any, Dict, List
+
+chapter_header = re.compile(
+    r"^\s*(?:chapter|unit|module|part|section)\s*(\d+)?\s*[:.)-]*\s*(.+)$",
+    flags=re.I
+)
+week_header = re.compile(
+    r"^\s*week\s*(\d+)\s*[:.)-]*\s*(.+)?$",
+    flags=re.I
+)
+topic_line = re.compile(
+    r"^\s*(?:[-•*]+|\d+\)|\d+\.\s+|[a-zA-Z]\))\s*(.+?)\s*$"
+)
+
+
+def extract_outline(text: str) -> Dict[str, Any]:
+    lines = [ln.strip() for ln in text.splitlines() if ln.strip()]
+    chapters: List[Dict[str, Any]] = []
+    current = None
+
+    for ln in lines:
+        m1 = chapter_header.match(ln)
+        m2 = week_header.match(ln)
+
+        if m1:
+            num, title = m1.group(1), m1.group(2) or ""
+            title = title.strip()
+            label = f"Chapter {num}: {title}" if num else f"Chapter: {title}"
+            current = {"title": label, "topics": []}
+            chapters.append(current)
+            continue
+
+        if m2:
+            num, title = m2.group(1), (m2.group(2) or "").strip()
+            label = f"Week {num}" + (f": {title}" if title else "")
+            current = {"title": label, "topics": []}
+            chapters.append(current)
+            continue
+
+        mt = topic_line.match(ln)
+        if mt and current:
+            topic = mt.group(1).strip()
+            if topic and len(topic) > 2:
+                current["topics"].append(topic)
+            continue
+
+        if current and 3 <= len(ln) <= 120 and not ln.lower().startswith(("chapter", "unit", "module", "part", "section", "week")):
+            if not re.search(r"(syllabus|objective|outcome|policy|grading|assessment)", ln, re.I):
+                current["topics"].append(ln)
+
+    if not chapters:
+        topics = []
+        for ln in lines:
+            mt = topic_line.match(ln)
+            if mt:
+                topics.append(mt.group(1).strip())
+        if topics:
+            chapters = [{"title": "Syllabus", "topics": topics}]
+
+    chapters = [c for c in chapters if c.get(
+        "title") and isinstance(c.get("topics"), list)]
+    return {"chapters": chapters}
@@ -0,0 +1,135 @@
+# app/parser_bench.py
+"""
+Benchmark the syllabus parser over the OCR texts stored in the syllabus DB.
+
+    python -m app.parser_bench --repeat 200
+    python -m app.parser_bench --save bench.json
+    python -m app.parser_bench --baseline bench.json
+
+Each subject's text is parsed --repeat times; the report has per-subject
+median and p95 parse time, overall throughput and the number of modules,
+units and books found. With --baseline the run is compared to a report saved
+earlier with --save: timing changes are shown as ratios and any subject whose
+counts differ is listed, so parser regressions show up as numbers.
+"""
+
+import sys
+import json
+import time
+import sqlite3
+import argparse
+from pathlib import Path
+from typing import Any, Dict, List
+
+from app.database_utils import DB_PATH
+from app.loadtest import percentile
+from app.syllabus_parser import PARSER_VERSION, parse_syllabus_structured
+
+
+def load_texts(db_path) -> List[Dict[str, Any]]:
+    with sqlite3.connect(db_path) as con:
+        con.row_factory = sqlite3.Row
+        rows = con.execute(
+            "SELECT id, name, text FROM syllabus WHERE text IS NOT NULL AND text != '' ORDER BY name, id").fetchall()
+    return [dict(r) for r in rows]
+
+
+def counts(structured: Dict[str, Any]) -> Dict[str, int]:
+    modules = structured.get("modules", [])
+    return {
+        "modules": len(modules),
+        "units": sum(len(m.get("units", [])) for m in modules),
+        "textbooks": len(structured.get("textbooks", [])),
+        "reference_books": len(structured.get("reference_books", [])),
+    }
+
+
+def bench(rows: List[Dict[str, Any]], repeat: int) -> Dict[str, Any]:
+    subjects = []
+    total_s = 0.0
+    total_chars = 0
+    for row in rows:
+        text = row["text"]
+        structured = parse_syllabus_structured(text)  # warm-up, also gives the counts
+        times = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            parse_syllabus_structured(text)
+            times.append(time.perf_counter() - start)
+        total_s += sum(times)
+        total_chars += len(text) * repeat
+        subjects.append({
+            "id": row["id"],
+            "name": row["name"],
+            "chars": len(text),
+            "p50_us": round(percentile(times, 50) * 1e6, 1),
+            "p95_us": round(percentile(times, 95) * 1e6, 1),
+            **counts(structured),
+        })
+
+    parses = len(rows) * repeat
+    return {
+        "parser_version": PARSER_VERSION,
+        "subjects": subjects,
+        "repeat": repeat,
+        "parses": parses,
+        "total_s": round(total_s, 4),
+        "parses_per_s": round(parses / total_s, 1) if total_s else 0.0,
+        "mb_per_s": round(total_chars / total_s / 1e6, 2) if total_s else 0.0,
+    }
+
+
+def compare(report: Dict[str, Any], baseline: Dict[str, Any]) -> List[str]:
+    lines = []
+    if baseline.get("parses_per_s"):
+        ratio = report["parses_per_s"] / baseline["parses_per_s"]
+        lines.append(f"throughput {report['parses_per_s']}/s vs {baseline['parses_per_s']}/s ({ratio:.2f}x)")
+
+    old = {s["id"]: s for s in baseline.get("subjects", [])}
+    keys = ("modules", "units", "textbooks", "reference_books")
+    for s in report["subjects"]:
+        b = old.get(s["id"])
+        if b is None:
+            continue
+        diff = [f"{k} {b.get(k)}->{s[k]}" for k in keys if b.get(k) != s[k]]
+        if diff:
+            lines.append(f"⚠️ {s['name']}: " + ", ".join(diff))
+    return lines
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    ap.add_argument("--db", default=str(DB_PATH), help="Syllabus DB to read texts from")
+    ap.add_argument("--repeat", type=int, default=100, help="Parses per subject")
+    ap.add_argument("--save", help="Write the JSON report to this file")
+    ap.add_argument("--baseline", help="Compare against a report saved with --save")
+    ap.add_argument("--json", action="store_true", help="Print the raw JSON report")
+    args = ap.parse_args(argv)
+
+    rows = load_texts(args.db)
+    if not rows:
+        print(f"❌ No syllabus texts in {args.db}")
+        return 1
+
+    report = bench(rows, max(1, args.repeat))
+    if args.save:
+        Path(args.save).write_text(json.dumps(report, indent=2))
+    if args.json:
+        print(json.dumps(report, indent=2))
+        return 0
+
+    print(f"\n{'subject':<24}{'chars':>7}{'p50us':>9}{'p95us':>9}{'mods':>6}{'units':>7}{'text':>6}{'ref':>5}")
+    for s in report["subjects"]:
+        print(f"{s['name'][:23]:<24}{s['chars']:>7}{s['p50_us']:>9}{s['p95_us']:>9}"
+              f"{s['modules']:>6}{s['units']:>7}{s['textbooks']:>6}{s['reference_books']:>5}")
+    print(f"\n{report['parses']} parses in {report['total_s']}s: "
+          f"{report['parses_per_s']} parses/s, {report['mb_per_s']} MB/s (parser v{PARSER_VERSION})")
+
+    if args.baseline:
+        for line in compare(report, json.loads(Path(args.baseline).read_text())):
+            print(line)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
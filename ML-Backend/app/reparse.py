@@ -0,0 +1,177 @@
+# app/reparse.py
+"""
+Bulk re-parse of stored syllabi after a parser change.
+
+    python -m app.reparse                 # every subject
+    python -m app.reparse --stale         # only rows parsed by an older parser
+    python -m app.reparse --subject ID --workers 4 --pause-ms 0
+
+extract_outline() and parse_syllabus_structured() run in a small process pool
+at reduced priority; results are written back REPARSE_BATCH rows per
+transaction, with an optional pause between batches so live requests keep
+getting the CPU and the SQLite write lock. The same routine backs
+POST /syllabus/reparse on the server, which also refreshes the cached chat
+context and RAG index when it finishes; after a CLI run the server picks up
+the new rows on its next restart, upload or reparse.
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple, Union
+
+from app.database_utils import DB_PATH
+from app.db import pool_for
+from app.outline import extract_outline
+from app.syllabus_parser import PARSER_VERSION, parse_syllabus_structured
+from app.syllabus_search import index_subject
+
+REPARSE_WORKERS = int(os.getenv("REPARSE_WORKERS", "2"))
+REPARSE_BATCH = int(os.getenv("REPARSE_BATCH", "50"))
+# Sleep between batches, to leave room for live traffic
+REPARSE_PAUSE_MS = int(os.getenv("REPARSE_PAUSE_MS", "50"))
+# Added to the pool workers' niceness (POSIX only)
+REPARSE_NICE = int(os.getenv("REPARSE_NICE", "10"))
+
+Progress = Callable[[Dict[str, Any]], None]
+
+
+def _init_worker(nice: int):
+    if nice and hasattr(os, "nice"):
+        try:
+            os.nice(nice)
+        except OSError:
+            pass
+
+
+def _parse_row(row: Tuple[str, str]) -> Tuple[str, Optional[str], Optional[str], Optional[str]]:
+    """(id, outline_json, structured_json, error); JSON is encoded in the worker."""
+    subject_id, text = row
+    try:
+        outline = extract_outline(text or "")
+        structured = parse_syllabus_structured(text or "")
+        return (subject_id, json.dumps(outline, ensure_ascii=False),
+                json.dumps(structured, ensure_ascii=False), None)
+    except Exception as e:
+        return subject_id, None, None, str(e)
+
+
+def _select(stale_only: bool, subject_ids: Optional[Sequence[str]]) -> Tuple[str, List[Any]]:
+    where, params = [], []
+    if stale_only:
+        where.append("(parser_version IS NULL OR parser_version != ? OR structured_json IS NULL)")
+        params.append(PARSER_VERSION)
+    if subject_ids:
+        where.append(f"id IN ({','.join('?' * len(subject_ids))})")
+        params.extend(subject_ids)
+    return (" AND ".join(where) or "1"), params
+
+
+def reparse_subjects(db_path: Union[str, Path] = DB_PATH, subject_ids: Optional[Sequence[str]] = None,
+                     stale_only: bool = False, workers: int = None, batch_size: int = None,
+                     pause_ms: int = None, progress: Optional[Progress] = None) -> Dict[str, Any]:
+    """
+    Re-parse matching subjects, store outline_json/structured_json and
+    refresh their search index rows.
+    Returns {"total", "done", "failed", "errors", "ids", "elapsed_s"}, where
+    ids are the subjects rewritten; progress(state) is called with the same
+    dict after every batch.
+    """
+    workers = max(1, workers or REPARSE_WORKERS)
+    batch_size = max(1, batch_size or REPARSE_BATCH)
+    pause = (REPARSE_PAUSE_MS if pause_ms is None else pause_ms) / 1000.0
+    where, params = _select(stale_only, subject_ids)
+
+    with pool_for(db_path).connection() as con:
+        total = con.execute(f"SELECT COUNT(*) FROM syllabus WHERE {where}", params).fetchone()[0]
+
+    state: Dict[str, Any] = {"total": total, "done": 0, "failed": 0, "errors": [], "ids": [],
+                             "elapsed_s": 0.0}
+    if progress:
+        progress(state)
+    if not total:
+        return state
+
+    start = time.perf_counter()
+    pool = ProcessPoolExecutor(
+        max_workers=min(workers, total), mp_context=multiprocessing.get_context("spawn"),
+        initializer=_init_worker, initargs=(REPARSE_NICE,))
+    try:
+        last_id = ""
+        while True:
+            # Keyset paging keeps only one batch of texts in memory
+            with pool_for(db_path).connection() as con:
+                batch = con.execute(
+                    f"SELECT id, text, name FROM syllabus WHERE {where} AND id > ? ORDER BY id LIMIT ?",
+                    params + [last_id, batch_size]).fetchall()
+            if not batch:
+                break
+            last_id = batch[-1][0]
+            names = {sid: name for sid, _, name in batch}
+
+            chunk = max(1, len(batch) // (workers * 4))
+            results = list(pool.map(_parse_row, [(sid, text) for sid, text, _ in batch], chunksize=chunk))
+            updates = [(outline, structured, PARSER_VERSION, sid)
+                       for sid, outline, structured, err in results if err is None]
+            with pool_for(db_path).connection() as con:
+                con.executemany(
+                    "UPDATE syllabus SET outline_json = ?, structured_json = ?, parser_version = ? WHERE id = ?",
+                    updates)
+                for _, structured, _, sid in updates:
+                    index_subject(con, sid, names[sid], json.loads(structured))
+                con.commit()
+
+            for sid, _, _, err in results:
+                if err is not None:
+                    state["errors"].append({"id": sid, "error": err})
+            state["ids"].extend(sid for _, _, _, sid in updates)
+            state["done"] += len(updates)
+            state["failed"] += len(results) - len(updates)
+            state["elapsed_s"] = round(time.perf_counter() - start, 3)
+            if progress:
+                progress(state)
+            if pause:
+                time.sleep(pause)
+    finally:
+        pool.shutdown(wait=True)
+
+    state["elapsed_s"] = round(time.perf_counter() - start, 3)
+    return state
+
+
+def main(argv=None):
+    ap = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    ap.add_argument("--db", default=str(DB_PATH), help="Syllabus DB to update")
+    ap.add_argument("--subject", action="append", help="Only this subject id (repeatable)")
+    ap.add_argument("--stale", action="store_true", help="Only rows parsed by an older parser version")
+    ap.add_argument("--workers", type=int, default=REPARSE_WORKERS)
+    ap.add_argument("--batch", type=int, default=REPARSE_BATCH, help="Rows per write transaction")
+    ap.add_argument("--pause-ms", type=int, default=REPARSE_PAUSE_MS, help="Sleep between batches")
+    args = ap.parse_args(argv)
+
+    # Older DBs may predate the structured_json/parser_version columns;
+    # main reads the DB path at import time
+    os.environ["SYLLABUS_DB_PATH"] = args.db
+    from app.main import init_db
+    init_db()
+
+    def show(state):
+        print(f"🔁 {state['done'] + state['failed']}/{state['total']} reparsed"
+              f" ({state['failed']} failed, {state['elapsed_s']}s)")
+
+    state = reparse_subjects(args.db, subject_ids=args.subject, stale_only=args.stale,
+                             workers=args.workers, batch_size=args.batch,
+                             pause_ms=args.pause_ms, progress=show)
+    for err in state["errors"]:
+        print(f"❌ {err['id']}: {err['error']}")
+    print(f"✅ Reparsed {state['done']} subject(s) in {state['elapsed_s']}s")
+    return 1 if state["failed"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,98 @@
+# app/single_flight.py
+"""
+Request coalescing: concurrent callers with the same key share one in-flight
+computation instead of each running their own.
+
+The shared work runs as its own task, so a caller that disconnects does not
+cancel it for everyone else waiting on the same key.
+"""
+
+import asyncio
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional
+
+
+def _consume_exception(task: asyncio.Future):
+    # Avoid "exception was never retrieved" if every waiter went away
+    if not task.cancelled():
+        task.exception()
+
+
+class _Broadcast:
+    def __init__(self):
+        self.tokens: List[str] = []
+        self.done = False
+        self.error: Optional[BaseException] = None
+        self.cond = asyncio.Condition()
+
+
+class SingleFlight:
+    def __init__(self):
+        self._calls: Dict[str, asyncio.Future] = {}
+        self._streams: Dict[str, _Broadcast] = {}
+        self.leaders = 0
+        self.coalesced = 0
+
+    async def do(self, key: str, fn: Callable[[], Awaitable[Any]]) -> Any:
+        """Run fn() once per key at a time; concurrent callers get its result."""
+        task = self._calls.get(key)
+        if task is None:
+            self.leaders += 1
+            task = asyncio.ensure_future(fn())
+            self._calls[key] = task
+
+            def _release(t, key=key):
+                if self._calls.get(key) is t:
+                    del self._calls[key]
+                _consume_exception(t)
+
+            task.add_done_callback(_release)
+        else:
+            self.coalesced += 1
+        return await asyncio.shield(task)
+
+    async def stream(self, key: str, fn: Callable[[], AsyncIterator[str]]) -> AsyncIterator[str]:
+        """Like do(), for token streams: late joiners replay what was already sent."""
+        b = self._streams.get(key)
+        if b is None:
+            self.leaders += 1
+            b = _Broadcast()
+            self._streams[key] = b
+            pump = asyncio.ensure_future(self._pump(key, b, fn()))
+            pump.add_done_callback(_consume_exception)
+        else:
+            self.coalesced += 1
+
+        sent = 0
+        while True:
+            async with b.cond:
+                await b.cond.wait_for(lambda: len(b.tokens) > sent or b.done)
+                new, done = b.tokens[sent:], b.done
+            for token in new:
+                yield token
+            sent += len(new)
+            if done and sent >= len(b.tokens):
+                break
+        if b.error is not None:
+            raise b.error
+
+    async def _pump(self, key: str, b: _Broadcast, tokens: AsyncIterator[str]):
+        try:
+            async for token in tokens:
+                async with b.cond:
+                    b.tokens.append(token)
+                    b.cond.notify_all()
+        except Exception as e:
+            b.error = e
+        finally:
+            if self._streams.get(key) is b:
+                del self._streams[key]
+            async with b.cond:
+                b.done = True
+                b.cond.notify_all()
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "in_flight": len(self._calls) + len(self._streams),
+            "leaders": self.leaders,
+            "coalesced": self.coalesced,
+        }
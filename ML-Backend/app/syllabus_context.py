@@ -1,9 +1,85 @@
+import os
+import re
 import json
-from app.database_utils import list_subjects, get_subject_by_name
-from app.syllabus_parser import parse_syllabus_structured  # NEW FILE
+import threading
+from typing import Any, Dict, List, Optional, Set, Tuple
+from app.database_utils import list_subjects, get_subject_by_name, get_structured, syllabus_fingerprint
+
+# Syllabus "generation": bumped whenever a subject is added or re-parsed.
+# The assembled context is cached per generation so chat requests don't
+# re-parse and re-serialise every subject on each query.
+_generation = 0
+_context_cache: Optional[Tuple[int, str]] = None
+_subjects_cache: Optional[Tuple[int, List[Dict[str, Any]]]] = None
+_fingerprint_cache: Optional[Tuple[int, str]] = None
+_lock = threading.Lock()
+
+# Query routing: only the best-matching subjects go into the prompt
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "6000"))
+CONTEXT_MAX_SUBJECTS = int(os.getenv("CONTEXT_MAX_SUBJECTS", "3"))
+
+_TERM_RE = re.compile(r"[a-z0-9]+")
+_STOPWORDS = {
+    "a", "an", "the", "and", "or", "of", "in", "on", "for", "to", "is", "are",
+    "what", "which", "who", "how", "why", "when", "where", "me", "tell", "about",
+    "explain", "list", "give", "all", "do", "does", "this", "that", "with",
+    "syllabus", "subject", "module", "modules", "unit", "units", "topic", "topics",
+}
+_BOOK_TERMS = {"book", "books", "textbook", "textbooks", "reference", "author", "authors", "publisher"}
+
+
+def get_generation() -> int:
+    return _generation
+
+
+def bump_generation() -> int:
+    """Invalidate the cached context after the syllabus table changes."""
+    global _generation, _context_cache, _subjects_cache, _fingerprint_cache
+    with _lock:
+        _generation += 1
+        _context_cache = None
+        _subjects_cache = None
+        _fingerprint_cache = None
+        return _generation
+
+
+def get_fingerprint() -> str:
+    """syllabus_fingerprint(), recomputed only when the generation changes."""
+    global _fingerprint_cache
+    generation = _generation
+    cached = _fingerprint_cache
+    if cached is not None and cached[0] == generation:
+        return cached[1]
+
+    fingerprint = syllabus_fingerprint()
+    with _lock:
+        if _generation == generation:
+            _fingerprint_cache = (generation, fingerprint)
+    return fingerprint
+
+
+def _terms(text: str) -> Set[str]:
+    return {t for t in _TERM_RE.findall((text or "").lower())
+            if len(t) > 1 and t not in _STOPWORDS}
+
+
+def _render_subject(name: str, modules, textbooks, reference_books) -> str:
+    return f"""
+===== SUBJECT: {name} =====
+
+Modules:
+{json.dumps(modules, indent=2)}
+
+Textbooks:
+{json.dumps(textbooks, indent=2)}
+
+Reference Books:
+{json.dumps(reference_books, indent=2)}
+"""
 
-def build_context():
-    context_parts = []
+
+def _load_subjects() -> List[Dict[str, Any]]:
+    entries = []
 
     subjects = list_subjects()
 
@@ -14,22 +90,170 @@ def build_context():
         if not row:
             continue
 
-        text = row["text"]
+        structured = get_structured(row)
+        modules = structured.get("modules", [])
+        textbooks = structured.get("textbooks", [])
+        reference_books = structured.get("reference_books", [])
 
-        structured = parse_syllabus_structured(text)
+        entries.append({
+            "name": name,
+            "structured": structured,
+            "block": _render_subject(name, modules, textbooks, reference_books),
+            "name_terms": _terms(name),
+            "module_terms": [
+                (_terms(m.get("title", "")),
+                 set().union(*[_terms(u.get("content", "")) for u in m.get("units", [])]))
+                for m in modules
+            ],
+            "book_terms": set().union(*[_terms(bk.get("title", "")) for bk in textbooks + reference_books]),
+            # Subjects the structured parser couldn't split are routed on raw text
+            "text": "" if modules else (row.get("text") or ""),
+            "text_terms": set() if modules else _terms(row.get("text") or ""),
+        })
 
-        ctx = f"""
-===== SUBJECT: {name} =====
+    return entries
 
-Modules:
-{json.dumps(structured.get("modules", []), indent=2)}
 
-Textbooks:
-{json.dumps(structured.get("textbooks", []), indent=2)}
+def _get_subjects() -> List[Dict[str, Any]]:
+    global _subjects_cache
+    generation = _generation
+    cached = _subjects_cache
+    if cached is not None and cached[0] == generation:
+        return cached[1]
 
-Reference Books:
-{json.dumps(structured.get("reference_books", []), indent=2)}
+    entries = _load_subjects()
+
+    # Only publish if nothing was uploaded/reparsed while we were building
+    with _lock:
+        if _generation == generation:
+            _subjects_cache = (generation, entries)
+    return entries
+
+
+def build_context():
+    global _context_cache
+    generation = _generation
+    cached = _context_cache
+    if cached is not None and cached[0] == generation:
+        return cached[1]
+
+    context = "\n\n".join(e["block"] for e in _get_subjects())
+
+    with _lock:
+        if _generation == generation:
+            _context_cache = (generation, context)
+    return context
+
+
+# -------------------- Query routing --------------------
+
+
+def estimate_tokens(text: str) -> int:
+    # ~4 characters per token is close enough for budgeting prompts
+    return len(text) // 4
+
+
+def _score_subject(entry: Dict[str, Any], q: Set[str]):
+    module_scores = [2 * len(q & title) + len(q & units)
+                     for title, units in entry["module_terms"]]
+    score = 5 * len(q & entry["name_terms"]) + sum(module_scores) + \
+        2 * len(q & entry["book_terms"]) + len(q & entry["text_terms"])
+    return score, module_scores
+
+
+def _overview(entries: List[Dict[str, Any]]) -> str:
+    lines = ["Available subjects and their modules:"]
+    for e in entries:
+        lines.append(f"- {e['name']}")
+        for m in e["structured"].get("modules", []):
+            lines.append(f"  - Module {m.get('module_no')}: {m.get('title', '')}")
+    return "\n".join(lines)
+
+
+def build_routed_context(query: str, token_budget: int = None, max_subjects: int = None) -> str:
+    """
+    Context limited to the subjects (or, if a subject is too large, the
+    modules) that best match the query, within token_budget. Falls back to the
+    full context when it fits, else to an overview of subjects and modules.
+    """
+    token_budget = token_budget or CONTEXT_TOKEN_BUDGET
+    max_subjects = max_subjects or CONTEXT_MAX_SUBJECTS
+    entries = _get_subjects()
+    q = _terms(query)
+
+    scored = []
+    for e in entries:
+        score, module_scores = _score_subject(e, q)
+        if score > 0:
+            scored.append((score, e, module_scores))
+    scored.sort(key=lambda x: -x[0])
+
+    parts: List[str] = []
+    used = 0
+    for score, e, module_scores in scored[:max_subjects]:
+        block = e["block"]
+        if e["text"]:
+            room = max(0, (token_budget - used) * 4 - 200)
+            block = f"\n===== SUBJECT: {e['name']} =====\n\nSyllabus text:\n{e['text'][:room]}\n"
+        if used + estimate_tokens(block) > token_budget:
+            # Whole subject doesn't fit: keep only the modules that matched
+            structured = e["structured"]
+            modules = [m for m, ms in zip(structured.get("modules", []), module_scores) if ms > 0]
+            wants_books = bool(q & _BOOK_TERMS) or bool(q & e["book_terms"])
+            block = _render_subject(
+                e["name"], modules,
+                structured.get("textbooks", []) if wants_books else [],
+                structured.get("reference_books", []) if wants_books else [],
+            )
+            if used + estimate_tokens(block) > token_budget:
+                continue
+        parts.append(block)
+        used += estimate_tokens(block)
+
+    if parts:
+        return "\n\n".join(parts)
+
+    full = build_context()
+    if estimate_tokens(full) <= token_budget:
+        return full
+    return _overview(entries)
+
+
+def build_syllabus_prompt(context: str, query: str, history: str = "") -> str:
+    if history:
+        history = f"""
+Conversation so far (for follow-up questions):
+{history}
 """
-        context_parts.append(ctx)
+    return f"""
+You are an academic assistant for students.
+
+Here is the syllabus data relevant to the question. Use it to answer:
+
+-------------------
+CONTEXT START
+{context}
+-------------------
+CONTEXT END
+{history}
+User question: {query}
 
-    return "\n\n".join(context_parts)
+Rules:
+- Give answers ONLY using the syllabus context.
+- If the question is about modules/units/books, extract correct info.
+- If not found, say 'This topic is not in the syllabus.'
+- if the the response is in bullet points, maintain the bullet points in your response also separate with <br />.
+
+
+### Response Format Rules (IMPORTANT)
+- Use clean GitHub-flavored Markdown (GFM).
+- Use headings (##, ###) only when needed.
+- If listing items, use proper markdown bullet points: `-` or `*`
+- Keep paragraphs short (1–3 lines each).
+- Keep bold text as **bold**.
+- Do NOT use <br />, or HTML tags.
+- Use code blocks only when necessary.
+- You may use emojis to make the answer engaging but do NOT overuse them.
+- NEVER add backslashes or escape characters unnecessarily.
+- The final output must look like a clean README.md section.
+"""
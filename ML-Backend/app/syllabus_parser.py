@@ -1,158 +1,205 @@
 import re
 
-def parse_modules_and_units(txt: str):
-    lines = [ln.strip() for ln in txt.splitlines() if ln.strip()]
-    modules = []
-    current_module = None
-    current_unit = None
-    in_theory = False
+# Bump whenever the output of parse_syllabus_structured() changes, so rows
+# persisted with an older parser are re-parsed lazily on next read.
+PARSER_VERSION = 1
+
+# Module/unit table (theory component)
+_LAB_RE = re.compile(r"\blaboratory component\b")
+_MODULE_RE = re.compile(r"^(\d+)\s+Title\b[:|]?\s*(.+)$", re.I)
+_SELF_RE = re.compile(r"^(\d+)\s+Self\b", re.I)
+# "4.1 | content" is preferred over "4.1 content"; a shorter number never
+# matches either branch, so one pattern behaves like trying both in turn.
+_UNIT_RE = re.compile(r"^(\d+(?:\.\d+)?)(?:\s*\|\s*(.+)|\s+(.+))$")
+_WS_RE = re.compile(r"\s+")
+
+# Book sections
+_TEXTBOOKS_RE = re.compile(r"^text\s*books", re.I)
+_REFERENCES_RE = re.compile(r"^reference\s*books", re.I)
+_REFERENCES_STOP_RE = re.compile(r"^reference\s*books")  # matched against the lowercased line
+_SR_HEADER_RE = re.compile(r"^sr\.", re.I)
+_BOOK_START_RE = re.compile(r"^\d+\s")
+
+# Book entries
+_INDEX_RE = re.compile(r"^\d+\s+")
+_YEAR_RE = re.compile(r"(19|20)\d{2}")
+_EDITION_RE = re.compile(r"\b[\w\d]+(?:st|nd|rd|th)?\s+Edition\b", re.I)
+_PUBLISHER_RE = re.compile(
+    r"(Pearson(?:\s+Education)?|PHI|Cambridge(?:\s+University\s+Press)?|"
+    r"MIT\s+Press|Research\s+India|McGraw[-\s]?Hill|Wiley|Springer|"
+    r"Oxford(?:\s+University\s+Press)?)"
+)
+
+# Section states
+_BEFORE, _INSIDE, _AFTER = 0, 1, 2
+
+
+def _split_lines(txt: str):
+    return [s for s in (ln.strip() for ln in txt.splitlines()) if s]
+
+
+class _BookSection:
+    """Collects raw book entries after a header line, up to an optional stop line."""
+
+    def __init__(self, header_re, stop_re=None):
+        self.header_re = header_re
+        self.stop_re = stop_re
+        self.state = _BEFORE
+        self.raw = []
+        self.current = ""
+
+    def feed(self, line: str):
+        if self.state == _BEFORE:
+            if self.header_re.search(line):
+                self.state = _INSIDE
+            return
+        if self.state == _AFTER:
+            return
+        if self.stop_re is not None and self.stop_re.search(line.lower()):
+            self.state = _AFTER
+            return
+        if _SR_HEADER_RE.match(line):
+            return
+        if _BOOK_START_RE.match(line):
+            if self.current:
+                self.raw.append(self.current.strip())
+            self.current = line
+        elif self.current:
+            self.current += " " + line
+
+    def books(self):
+        raw = self.raw + [self.current.strip()] if self.current else self.raw
+        books = []
+        for entry in map(parse_book_entry, raw):
+            if entry.get("title"):
+                books.append(entry)
+        return books
+
+
+class _ModuleTable:
+    """Builds modules and units from the theory component table."""
+
+    def __init__(self):
+        self.state = _BEFORE
+        self.modules = []
+        self.current_module = None
+        self.current_unit = None
+
+    def feed(self, line: str):
+        if self.state != _INSIDE:
+            if self.state == _BEFORE and "theory component" in line.lower():
+                self.state = _INSIDE
+            return
 
-    for line in lines:
         low = line.lower()
 
-        # Enter theory component section
-        if not in_theory:
-            if "theory component" in low:
-                in_theory = True
-            continue
-
         # Stop when lab/books start
-        if re.search(r"\blaboratory component\b", low):
-            break
-        if low.startswith("text books") or low.startswith("textbooks"):
-            break
-        if low.startswith("reference books"):
-            break
+        if (_LAB_RE.search(low) or low.startswith("text books")
+                or low.startswith("textbooks") or low.startswith("reference books")):
+            self.state = _AFTER
+            return
 
         # Skip headers like: Module | Unit | No.
         if "module" in low and "unit" in low and "no" in low:
-            continue
-        if low.startswith("topics ref"):
-            continue
-        if low.startswith("total "):
-            continue
-
-        # MODULE — pattern: "1 Title | Something"
-        m_mod = re.match(r"^(\d+)\s+Title\b[:|]?\s*(.+)$", line, re.I)
-        if m_mod:
-            module_no = int(m_mod.group(1))
-            title = m_mod.group(2).strip().rstrip(".")
-            current_module = {
-                "module_no": module_no,
-                "title": title,
-                "units": [],
-            }
-            modules.append(current_module)
-            current_unit = None
-            continue
-
-        # SELF-STUDY Module
-        m_self = re.match(r"^(\d+)\s+Self\b.*", line, re.I)
-        if m_self:
-            module_no = int(m_self.group(1))
-            current_module = {
-                "module_no": module_no,
-                "title": "Self Study",
-                "units": [],
-            }
-            modules.append(current_module)
-            current_unit = None
-
-            # parse inline unit
-            if "|" in line:
-                after_pipe = line.split("|", 1)[1].strip()
-                after_pipe = after_pipe.split("|", 1)[0].strip()
-                if after_pipe:
-                    current_unit = {
-                        "unit_no": f"{module_no}.1",
-                        "content": after_pipe,
-                    }
-                    current_module["units"].append(current_unit)
-            continue
-
-        # UNIT patterns
-        if current_module:
-            m_unit = re.match(r"^(\d+(?:\.\d+)?)\s*\|\s*(.+)$", line)
-            if not m_unit:
-                m_unit = re.match(r"^(\d+(?:\.\d+)?)\s+(.+)$", line)
-
-            if m_unit:
-                num_str = m_unit.group(1).strip()
-                rest = m_unit.group(2).strip()
-
-                # ignore false module header
-                if rest.lower().startswith("title"):
-                    continue
-
-                # Fix OCR: "41" -> "4.1"
-                unit_no = num_str
-                if (
-                    "." not in num_str
-                    and len(num_str) == 2
-                    and str(current_module["module_no"]) == num_str[0]
-                ):
-                    unit_no = f"{num_str[0]}.{num_str[1]}"
-
-                rest = rest.split("|", 1)[0].strip()
-
-                if rest:
-                    current_unit = {
-                        "unit_no": unit_no,
-                        "content": rest,
-                    }
-                    current_module["units"].append(current_unit)
-                else:
-                    current_unit = None
-                continue
+            return
+        if low.startswith("topics ref") or low.startswith("total "):
+            return
+
+        if line[0].isdigit():
+            # MODULE — pattern: "1 Title | Something"
+            m = _MODULE_RE.match(line)
+            if m:
+                self.current_module = {
+                    "module_no": int(m.group(1)),
+                    "title": m.group(2).strip().rstrip("."),
+                    "units": [],
+                }
+                self.modules.append(self.current_module)
+                self.current_unit = None
+                return
+
+            # SELF-STUDY Module, optionally with an inline unit
+            m = _SELF_RE.match(line)
+            if m:
+                module_no = int(m.group(1))
+                self.current_module = {
+                    "module_no": module_no,
+                    "title": "Self Study",
+                    "units": [],
+                }
+                self.modules.append(self.current_module)
+                self.current_unit = None
+                if "|" in line:
+                    after_pipe = line.split("|", 1)[1].strip().split("|", 1)[0].strip()
+                    if after_pipe:
+                        self.current_unit = {"unit_no": f"{module_no}.1", "content": after_pipe}
+                        self.current_module["units"].append(self.current_unit)
+                return
+
+            if self.current_module:
+                m = _UNIT_RE.match(line)
+                if m:
+                    self._unit(m.group(1), (m.group(2) or m.group(3)).strip())
+                    return
 
         # CONTINUATION lines
-        if current_module and current_unit:
-            if re.match(r"^\d+\s+Title\b", line, re.I):
-                continue
-            if line.lower().startswith(
-                ("text books", "reference books", "laboratory component")
-            ):
-                continue
-
+        if self.current_module and self.current_unit:
             cont = line.split("|", 1)[0].strip()
             if not cont:
-                continue
-            if not current_unit["content"].endswith((" ", "-", "/")):
-                current_unit["content"] += " "
-            current_unit["content"] += cont
-            continue
+                return
+            if not self.current_unit["content"].endswith((" ", "-", "/")):
+                self.current_unit["content"] += " "
+            self.current_unit["content"] += cont
+
+    def _unit(self, num_str: str, rest: str):
+        # ignore false module header
+        if rest.lower().startswith("title"):
+            return
+
+        # Fix OCR: "41" -> "4.1"
+        unit_no = num_str
+        if (
+            "." not in num_str
+            and len(num_str) == 2
+            and str(self.current_module["module_no"]) == num_str[0]
+        ):
+            unit_no = f"{num_str[0]}.{num_str[1]}"
+
+        rest = rest.split("|", 1)[0].strip()
+        if rest:
+            self.current_unit = {"unit_no": unit_no, "content": rest}
+            self.current_module["units"].append(self.current_unit)
+        else:
+            self.current_unit = None
+
+    def result(self):
+        for mod in self.modules:
+            for u in mod["units"]:
+                u["content"] = _WS_RE.sub(" ", u["content"]).strip()
+        return self.modules
 
-    # cleanup
-    for mod in modules:
-        for u in mod.get("units", []):
-            if isinstance(u.get("content"), str):
-                u["content"] = re.sub(r"\s+", " ", u["content"]).strip()
 
-    return modules
+def parse_modules_and_units(txt: str):
+    table = _ModuleTable()
+    for line in _split_lines(txt):
+        table.feed(line)
+    return table.result()
 
 
 def parse_book_entry(raw: str):
-    import re
-    s = raw.replace("|", " ")
-    s = re.sub(r"\s+", " ", s).strip()
+    s = _WS_RE.sub(" ", raw.replace("|", " ")).strip()
 
     # remove leading index number
-    s = re.sub(r"^\d+\s+", "", s)
+    s = _INDEX_RE.sub("", s, count=1)
 
     # Remove year
-    year_match = re.search(r"(19|20)\d{2}", s)
+    year_match = _YEAR_RE.search(s)
     if year_match:
         s_wo_year = s[:year_match.start()].strip()
     else:
         s_wo_year = s
 
-    publisher_pat = (
-        r"(Pearson(?:\s+Education)?|PHI|Cambridge(?:\s+University\s+Press)?|"
-        r"MIT\s+Press|Research\s+India|McGraw[-\s]?Hill|Wiley|Springer|"
-        r"Oxford(?:\s+University\s+Press)?)"
-    )
-
-    ed_match = re.search(r"\b[\w\d]+(?:st|nd|rd|th)?\s+Edition\b", s_wo_year, re.I)
+    ed_match = _EDITION_RE.search(s_wo_year)
 
     title = ""
     authors = ""
@@ -166,14 +213,14 @@ def parse_book_entry(raw: str):
 
         title = before_ed.rstrip(".,;")
         if after_ed:
-            m_pub = re.search(publisher_pat, after_ed)
+            m_pub = _PUBLISHER_RE.search(after_ed)
             if m_pub:
                 authors = after_ed[:m_pub.start()].strip().rstrip(",;")
                 publisher = after_ed[m_pub.start():].strip().rstrip(".,;")
             else:
                 authors = after_ed.strip().rstrip(",;")
     else:
-        m_pub = re.search(publisher_pat, s_wo_year)
+        m_pub = _PUBLISHER_RE.search(s_wo_year)
         if m_pub:
             before_p = s_wo_year[:m_pub.start()].strip()
             publisher = s_wo_year[m_pub.start():].strip().rstrip(".,;")
@@ -190,72 +237,30 @@ def parse_book_entry(raw: str):
 
 
 def extract_books_from_text(txt: str, header_pattern: str, stop_patterns):
-    lines = [ln.strip() for ln in txt.splitlines() if ln.strip()]
-    n = len(lines)
-
-    header_idx = -1
-    for i, l in enumerate(lines):
-        if re.search(header_pattern, l, re.I):
-            header_idx = i
-            break
-    if header_idx == -1:
-        return []
-
-    stop_idx = n
-    if stop_patterns:
-        for i in range(header_idx + 1, n):
-            low = lines[i].lower()
-            if any(re.search(sp, low) for sp in stop_patterns):
-                stop_idx = i
-                break
-
-    section_lines = [ln for ln in lines[header_idx + 1:stop_idx] if ln]
-
-    # remove headers
-    section_lines = [ln for ln in section_lines if not re.match(r"^sr\.", ln, re.I)]
-
-    books_raw = []
-    current = ""
-
-    for ln in section_lines:
-        if re.match(r"^\d+\s", ln):
-            if current:
-                books_raw.append(current.strip())
-            current = ln
-        else:
-            if current:
-                current += " " + ln
-
-    if current:
-        books_raw.append(current.strip())
-
-    books = []
-    for raw in books_raw:
-        entry = parse_book_entry(raw)
-        if entry.get("title"):
-            books.append(entry)
-
-    return books
+    stop = "|".join(f"(?:{sp})" for sp in stop_patterns) if stop_patterns else None
+    section = _BookSection(re.compile(header_pattern, re.I),
+                           re.compile(stop) if stop else None)
+    for line in _split_lines(txt):
+        section.feed(line)
+    return section.books()
 
 
 def parse_syllabus_structured(txt: str):
     """
     Main function you will import in syllabus_context.py
+
+    One pass over the lines feeds the module table and both book sections.
     """
-    modules = parse_modules_and_units(txt)
-    textbooks = extract_books_from_text(
-        txt,
-        header_pattern=r"^text\s*books",
-        stop_patterns=[r"^reference\s*books"],
-    )
-    reference_books = extract_books_from_text(
-        txt,
-        header_pattern=r"^reference\s*books",
-        stop_patterns=[],
-    )
+    table = _ModuleTable()
+    textbooks = _BookSection(_TEXTBOOKS_RE, _REFERENCES_STOP_RE)
+    references = _BookSection(_REFERENCES_RE)
+    for line in _split_lines(txt):
+        table.feed(line)
+        textbooks.feed(line)
+        references.feed(line)
 
     return {
-        "modules": modules,
-        "textbooks": textbooks,
-        "reference_books": reference_books,
+        "modules": table.result(),
+        "textbooks": textbooks.books(),
+        "reference_books": references.books(),
     }
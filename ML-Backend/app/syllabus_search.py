@@ -0,0 +1,154 @@
+# app/syllabus_search.py
+"""
+Full-text search over parsed syllabi (SQLite FTS5).
+
+One row per module title, unit and book title, tagged with its subject,
+module and unit numbers, so "which subjects cover clock synchronization" is
+answered from the index instead of scanning every OCR text. Results are
+ranked with BM25. Writers call index_subject() inside the same transaction
+that stores structured_json; sync_search_index() backfills subjects that
+were never indexed or were indexed by an older parser.
+"""
+
+import re
+import json
+import sqlite3
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Union
+
+from app.db import pool_for
+from app.syllabus_parser import PARSER_VERSION, parse_syllabus_structured
+
+_TERM_RE = re.compile(r"\w+", re.UNICODE)
+
+
+def init_search_index(con: sqlite3.Connection):
+    con.execute(
+        """
+        CREATE VIRTUAL TABLE IF NOT EXISTS syllabus_fts USING fts5(
+            body,
+            subject_id UNINDEXED,
+            subject_name UNINDEXED,
+            kind UNINDEXED,
+            module_no UNINDEXED,
+            module_title UNINDEXED,
+            unit_no UNINDEXED,
+            tokenize = 'porter unicode61'
+        );
+        """
+    )
+    # Which parser version each subject was indexed with
+    con.execute(
+        """
+        CREATE TABLE IF NOT EXISTS syllabus_fts_state (
+            subject_id TEXT PRIMARY KEY,
+            parser_version INTEGER NOT NULL
+        );
+        """
+    )
+
+
+def _entries(structured: Dict[str, Any]):
+    for mod in structured.get("modules", []):
+        no, title = mod.get("module_no"), mod.get("title") or ""
+        if title:
+            yield title, "module", no, title, None
+        for unit in mod.get("units", []):
+            if unit.get("content"):
+                yield unit["content"], "unit", no, title, unit.get("unit_no")
+    for kind, key in (("textbook", "textbooks"), ("reference_book", "reference_books")):
+        for book in structured.get(key, []):
+            if book.get("title"):
+                yield book["title"], kind, None, None, None
+
+
+def remove_subject(con: sqlite3.Connection, subject_id: str):
+    con.execute("DELETE FROM syllabus_fts WHERE subject_id = ?", (subject_id,))
+    con.execute("DELETE FROM syllabus_fts_state WHERE subject_id = ?", (subject_id,))
+
+
+def index_subject(con: sqlite3.Connection, subject_id: str, name: str, structured: Dict[str, Any]):
+    """Replace one subject's rows; the caller commits."""
+    remove_subject(con, subject_id)
+    con.executemany(
+        "INSERT INTO syllabus_fts (body, subject_id, subject_name, kind, module_no, module_title, unit_no) "
+        "VALUES (?, ?, ?, ?, ?, ?, ?)",
+        [(body, subject_id, name, kind, no, title, unit_no)
+         for body, kind, no, title, unit_no in _entries(structured)],
+    )
+    con.execute(
+        "INSERT INTO syllabus_fts_state (subject_id, parser_version) VALUES (?, ?)",
+        (subject_id, PARSER_VERSION),
+    )
+
+
+def sync_search_index(db_path: Union[str, Path]) -> int:
+    """Index subjects missing from (or stale in) the index; drop deleted ones."""
+    with pool_for(db_path).connection() as con:
+        init_search_index(con)
+        gone = con.execute(
+            "SELECT subject_id FROM syllabus_fts_state WHERE subject_id NOT IN (SELECT id FROM syllabus)").fetchall()
+        for (sid,) in gone:
+            remove_subject(con, sid)
+        rows = con.execute(
+            """
+            SELECT s.id, s.name, s.text, s.structured_json, s.parser_version
+            FROM syllabus s LEFT JOIN syllabus_fts_state f ON f.subject_id = s.id
+            WHERE f.parser_version IS NULL OR f.parser_version != ?
+            """,
+            (PARSER_VERSION,),
+        ).fetchall()
+        for sid, name, text, structured_json, version in rows:
+            structured = None
+            if structured_json and version == PARSER_VERSION:
+                try:
+                    structured = json.loads(structured_json)
+                except ValueError:
+                    pass
+            if structured is None:
+                structured = parse_syllabus_structured(text or "")
+            index_subject(con, sid, name, structured)
+        con.commit()
+    return len(rows)
+
+
+def _match_expr(query: str, op: str) -> str:
+    # Quote every term so user input can't hit FTS5 query syntax
+    return f" {op} ".join(f'"{t}"' for t in _TERM_RE.findall(query))
+
+
+def search_syllabus(db_path: Union[str, Path], query: str, limit: int = 20,
+                    subject_id: Optional[str] = None) -> List[Dict[str, Any]]:
+    """
+    BM25-ranked matches (best first). Every term must match; when nothing
+    does, any term may.
+    """
+    if not _TERM_RE.search(query or ""):
+        return []
+    sql = (
+        "SELECT subject_id, subject_name, kind, module_no, module_title, unit_no, body, "
+        "snippet(syllabus_fts, 0, '[', ']', '…', 12), bm25(syllabus_fts) AS score "
+        "FROM syllabus_fts WHERE syllabus_fts MATCH ?"
+        + (" AND subject_id = ?" if subject_id else "")
+        + " ORDER BY score LIMIT ?"
+    )
+    with pool_for(db_path).connection() as con:
+        for op in ("AND", "OR"):
+            params = [_match_expr(query, op)] + ([subject_id] if subject_id else []) + [limit]
+            rows = con.execute(sql, params).fetchall()
+            if rows:
+                break
+    return [
+        {
+            "subject_id": r[0],
+            "subject": r[1],
+            "kind": r[2],
+            "module_no": r[3],
+            "module_title": r[4],
+            "unit_no": r[5],
+            "text": r[6],
+            "snippet": r[7],
+            "score": round(-r[8], 4),
+        }
+        for r in rows
+    ]
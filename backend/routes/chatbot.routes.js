@@ -1,10 +1,9 @@
 const express = require("express");
 const router = express.Router();
 
-const { GoogleGenerativeAI } = require("@google/generative-ai");
-
-// Init Gemini Model
-const genAI = new GoogleGenerativeAI(process.env.GEMINI_API_KEY);
+// Gemini calls go through the ML backend so they share its rate limit and
+// priority queue instead of hitting the quota independently.
+const ML_SERVER_URL = process.env.ML_SERVER_URL || "http://localhost:8000";
 
 router.post("/chat", async (req, res) => {
   try {
@@ -14,13 +13,31 @@ router.post("/chat", async (req, res) => {
       return res.status(400).json({ success: false, message: "query is required" });
     }
 
-    const model = genAI.getGenerativeModel({ model: "models/gemini-2.5-flash" });
+    const formData = new FormData();
+    formData.append("query", query);
+
+    const mlRes = await fetch(`${ML_SERVER_URL}/general-chat/gemini`, {
+      method: "POST",
+      body: formData,
+    });
+
+    if (mlRes.status === 429) {
+      const retryAfter = mlRes.headers.get("retry-after");
+      if (retryAfter) res.set("Retry-After", retryAfter);
+      return res.status(429).json({
+        success: false,
+        message: "Gemini is busy, please retry shortly",
+      });
+    }
 
-    const result = await model.generateContent(query);
+    const data = await mlRes.json();
+    if (!mlRes.ok) {
+      throw new Error(data.detail || `ML backend returned ${mlRes.status}`);
+    }
 
     return res.json({
       success: true,
-      response: result.response.text(),
+      response: data.response,
     });
 
   } catch (error) {
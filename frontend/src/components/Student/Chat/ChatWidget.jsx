@@ -1,5 +1,4 @@
 import { useEffect, useState, useRef } from "react";
-import axios from "axios";
 import { FiSend, FiX, FiBookOpen, FiMessageCircle, FiCpu } from "react-icons/fi";
 import { FaRobot } from "react-icons/fa6";
 import ReactMarkdown from "react-markdown";
@@ -52,11 +51,44 @@ const ChatWidget = ({ open, onClose }) => {
 
         const query = useRag ? "chat" : "general-chat";
 
+        // Append streamed text to the last (bot) message
+        const appendToBot = (chunk) =>
+            setMessages((prev) => {
+                const last = prev[prev.length - 1];
+                return [...prev.slice(0, -1), { ...last, text: last.text + chunk }];
+            });
+
         try {
-            const res = await axios.post(`${ML_SERVER_URL}/${query}/gemini`, formData);
+            const res = await fetch(`${ML_SERVER_URL}/${query}/gemini/stream`, {
+                method: "POST",
+                body: formData,
+            });
+            if (!res.ok || !res.body) throw new Error(`HTTP ${res.status}`);
+
+            setMessages((prev) => [...prev, { sender: "bot", text: "" }]);
+            setLoading(false);
+
+            // Parse server-sent events: blank-line separated, one "data:" per line
+            const reader = res.body.getReader();
+            const decoder = new TextDecoder();
+            let buffer = "";
+            for (;;) {
+                const { value, done } = await reader.read();
+                if (done) break;
+                buffer += decoder.decode(value, { stream: true });
 
-            if (res.data?.success) {
-                setMessages((prev) => [...prev, { sender: "bot", text: res.data.response }]);
+                let sep;
+                while ((sep = buffer.indexOf("\n\n")) !== -1) {
+                    const event = buffer.slice(0, sep);
+                    buffer = buffer.slice(sep + 2);
+                    if (event.startsWith("event: done")) continue;
+                    const data = event
+                        .split("\n")
+                        .filter((l) => l.startsWith("data:"))
+                        .map((l) => l.slice(5).replace(/^ /, ""))
+                        .join("\n");
+                    if (data) appendToBot(data);
+                }
             }
         } catch {
             setMessages((prev) => [...prev, { sender: "bot", text: "⚠️ Could not reach AI server." }]);
@@ -26,6 +26,7 @@ import RefreshIcon from "@mui/icons-material/Refresh";
 import "./Syllabus.css";
 
 const apiUrl = import.meta.env.VITE_ML_SERVER_URL;
+const JOB_POLL_MS = 1500;
 
 const AddSyllabus = () => {
   const [subjectName, setSubjectName] = useState("");
@@ -99,8 +100,23 @@ const AddSyllabus = () => {
         timeout: 120000,
       });
 
-      setSyllabusText(res.data?.text || "");
-      setSyllabusId(res.data?.subject_id || "");
+      // OCR runs as a background job on the server; poll until it finishes
+      const jobId = res.data?.job_id;
+      setInfo("Upload received, extracting text...");
+      let job = res.data;
+      while (job?.status === "queued" || job?.status === "running") {
+        await new Promise((r) => setTimeout(r, JOB_POLL_MS));
+        job = (await axios.get(`${apiUrl}/ocr/jobs/${jobId}`)).data;
+      }
+
+      if (job?.status !== "done") {
+        setInfo("");
+        setError(job?.error || "Failed to extract syllabus.");
+        return;
+      }
+
+      setSyllabusText(job.text || "");
+      setSyllabusId(job.subject_id || "");
       setInfo("Syllabus extracted successfully!");
       fetchSubjects();
     } catch (e) {